@@ -1,10 +1,19 @@
-from django.contrib import admin
+from collections import Counter
+
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import HttpResponseRedirect
 from .models import (
     ClassLevel, Field, Axis, Subject, Lecturer, Student,
-    Request, RequestResult, Attachment, AuditLog, Notification
+    Request, RequestResult, Attachment, AttachmentBlob, AuditLog, Notification, NotificationCounter,
+    Workload
 )
+from .notifications import count_created, delete_notifications
+from .workflow import RequestConflict, compare_and_swap
+from .workload import adjust_workloads, is_open
 
 
 class LecturerInline(admin.StackedInline):
@@ -70,7 +79,7 @@ class StudentAdmin(admin.ModelAdmin):
 class AttachmentInline(admin.TabularInline):
     model = Attachment
     extra = 0
-    readonly_fields = ['uploaded_by', 'uploaded_at', 'filename', 'mime_type', 'size']
+    readonly_fields = ['uploaded_by', 'uploaded_at', 'filename', 'mime_type', 'size', 'processing_status', 'checksum']
 
 
 class AuditLogInline(admin.TabularInline):
@@ -80,12 +89,32 @@ class AuditLogInline(admin.TabularInline):
     can_delete = False
 
 
+class RequestAdminForm(forms.ModelForm):
+    """Renvoie en champ caché la version affichée, pour détecter les modifications concurrentes"""
+
+    class Meta:
+        model = Request
+        fields = '__all__'
+        widgets = {'version': forms.HiddenInput}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk and cleaned_data.get('version') != self.instance.version:
+            raise forms.ValidationError(
+                "La requête a été modifiée depuis l'ouverture de ce formulaire: rechargez la page."
+            )
+        return cleaned_data
+
+
 @admin.register(Request)
 class RequestAdmin(admin.ModelAdmin):
+    form = RequestAdminForm
     list_display = ['id', 'student_name', 'matricule', 'subject', 'type', 'status', 'submitted_at', 'assigned_to']
     list_filter = ['status', 'type', 'class_level', 'field', 'submitted_at']
     search_fields = ['id', 'matricule', 'student_name', 'subject__name']
-    readonly_fields = ['id', 'student', 'matricule', 'student_name', 'submitted_at']
+    # Statut et clôture en lecture seule: les transitions passent par le
+    # workflow de l'API (journal, résultat, charges de travail)
+    readonly_fields = ['id', 'student', 'matricule', 'student_name', 'submitted_at', 'status', 'closed_at']
     inlines = [AttachmentInline, AuditLogInline]
 
     fieldsets = (
@@ -99,10 +128,42 @@ class RequestAdmin(admin.ModelAdmin):
             'fields': ('status', 'assigned_to', 'closed_at')
         }),
         ('Métadonnées', {
-            'fields': ('id', 'submitted_at')
+            'fields': ('id', 'submitted_at', 'version')
         }),
     )
 
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        """
+        Transition passée entre la validation du formulaire et l'UPDATE:
+        tout l'enregistrement est annulé et le formulaire rechargé avec un
+        message, au lieu d'une erreur 500
+        """
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except RequestConflict as exc:
+            self.message_user(request, exc.detail, messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+    def save_model(self, request, obj, form, change):
+        """
+        Modification: seules les colonnes changées sont écrites, par
+        compare_and_swap sur la version affichée (RequestConflict si une
+        transition est passée entre-temps). Une requête ouverte créée ou
+        réassignée compte dans la charge de son assigné.
+        """
+        with transaction.atomic():
+            if change:
+                changes = {name: form.cleaned_data[name] for name in form.changed_data if name != 'version'}
+                if changes:
+                    compare_and_swap([obj], **changes)
+            else:
+                super().save_model(request, obj, form, change)
+            if is_open(obj.status):
+                deltas = Counter({obj.assigned_to_id: 1})
+                if change:
+                    deltas[form.initial.get('assigned_to')] -= 1
+                adjust_workloads(deltas)
+
 
 @admin.register(RequestResult)
 class RequestResultAdmin(admin.ModelAdmin):
@@ -113,9 +174,16 @@ class RequestResultAdmin(admin.ModelAdmin):
 
 @admin.register(Attachment)
 class AttachmentAdmin(admin.ModelAdmin):
-    list_display = ['filename', 'request', 'uploaded_by', 'mime_type', 'size', 'uploaded_at']
-    list_filter = ['uploaded_at', 'mime_type']
-    readonly_fields = ['uploaded_at']
+    list_display = ['filename', 'request', 'uploaded_by', 'mime_type', 'size', 'processing_status', 'uploaded_at']
+    list_filter = ['uploaded_at', 'mime_type', 'processing_status']
+    readonly_fields = ['uploaded_at', 'blob', 'processing_status', 'processing_error', 'checksum', 'thumbnail']
+
+
+@admin.register(AttachmentBlob)
+class AttachmentBlobAdmin(admin.ModelAdmin):
+    list_display = ['checksum', 'size', 'ref_count', 'created_at']
+    search_fields = ['checksum']
+    readonly_fields = ['checksum', 'file', 'size', 'ref_count', 'created_at']
 
 
 @admin.register(AuditLog)
@@ -131,7 +199,40 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'read', 'created_at']
     list_filter = ['read', 'created_at']
     search_fields = ['title', 'body', 'user__username']
-    readonly_fields = ['created_at']
+    # read (et user une fois créée) en lecture seule: le compteur de non
+    # lues suit les créations et suppressions, les lectures passent par l'API
+    readonly_fields = ['created_at', 'read']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return self.readonly_fields + ['user']
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                count_created([obj])
+
+    def delete_model(self, request, obj):
+        delete_notifications(Notification.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_notifications(queryset)
+
+
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ['user', 'unread']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'unread']
+
+
+@admin.register(Workload)
+class WorkloadAdmin(admin.ModelAdmin):
+    list_display = ['user', 'open_requests']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'open_requests']
 
 
 # Re-register UserAdmin
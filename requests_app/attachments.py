@@ -0,0 +1,272 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+
+from .models import Attachment, AttachmentBlob
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (256, 256)
+THUMBNAIL_MIME_TYPES = {'image/png', 'image/jpeg', 'image/jpg'}
+
+_local = threading.local()
+
+
+class ChecksumUploadMixin:
+    """
+    Calcule le SHA-256 d'un fichier pendant sa réception: l'empreinte est
+    disponible sur le fichier (uploaded_file.sha256) sans relecture.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Avant super(): le handler mémoire lève StopFutureHandlers s'il prend le fichier
+        self._digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # Ce handler a consommé le bloc
+            self._digest.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self._digest.hexdigest()
+        return uploaded_file
+
+
+class ChecksumMemoryFileUploadHandler(ChecksumUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class ChecksumTemporaryFileUploadHandler(ChecksumUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_checksum(fh):
+    """SHA-256 d'un fichier déjà reçu (repli si les handlers ci-dessus ne sont pas actifs)"""
+    digest = hashlib.sha256()
+    for chunk in fh.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def acquire_blob(uploaded_file):
+    """
+    Retourne le blob correspondant au contenu du fichier, en prenant une
+    référence dessus. Le fichier n'est écrit dans le stockage que si ce
+    contenu n'y est pas déjà.
+    """
+    checksum = getattr(uploaded_file, 'sha256', None) or file_checksum(uploaded_file)
+
+    blob = _add_reference(checksum)
+    if blob is not None:
+        return blob
+
+    blob = AttachmentBlob(checksum=checksum, size=uploaded_file.size, ref_count=1)
+    # Toujours un nouveau nom: un blob en cours de libération peut encore
+    # avoir son fichier (supprimé au commit) sous le nom canonique
+    blob.file.save(uploaded_file.name, uploaded_file, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # Même contenu enregistré en parallèle: garder l'autre copie
+        blob.file.delete(save=False)
+        blob = _add_reference(checksum)
+        if blob is None:
+            raise
+    return blob
+
+
+def _add_reference(checksum):
+    updated = AttachmentBlob.objects.filter(checksum=checksum).update(ref_count=F('ref_count') + 1)
+    if not updated:
+        return None
+    return AttachmentBlob.objects.get(checksum=checksum)
+
+
+def release_blob(blob_id):
+    """
+    Rend une référence sur un blob; à zéro le blob est supprimé et son
+    fichier effacé après le commit.
+    """
+    with transaction.atomic():
+        AttachmentBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        blob = AttachmentBlob.objects.select_for_update().filter(
+            pk=blob_id, ref_count=0
+        ).exclude(attachments__isnull=False).first()
+        if blob is None:
+            return
+        name = blob.file.name
+        storage = blob.file.storage
+        blob.delete()
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def detect_mime_type(head):
+    """Type MIME réel d'après les premiers octets (une instance libmagic par thread)"""
+    mime = getattr(_local, 'magic', None)
+    if mime is None:
+        import magic
+        mime = _local.magic = magic.Magic(mime=True)
+    return mime.from_buffer(head)
+
+
+def make_thumbnail(fh):
+    """Miniature PNG d'une image, ou None si elle n'est pas lisible"""
+    from PIL import Image
+
+    try:
+        with Image.open(fh) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, format='PNG')
+            return buffer.getvalue()
+    except Exception:
+        logger.warning("Miniature impossible", exc_info=True)
+        return None
+
+
+def process_attachment(attachment_id):
+    """
+    Validation MIME, empreinte SHA-256 et miniature d'une pièce jointe.
+
+    Le fichier est lu une seule fois par blocs; seul l'en-tête sert à la
+    détection MIME.
+    """
+    updated = Attachment.objects.filter(
+        pk=attachment_id, processing_status='pending'
+    ).update(processing_status='processing')
+    if not updated:
+        return
+
+    attachment = Attachment.objects.get(pk=attachment_id)
+    try:
+        if attachment.blob_id and _copy_from_sibling(attachment):
+            return
+
+        digest = None if attachment.checksum else hashlib.sha256()
+        with attachment.file.open('rb') as fh:
+            head = fh.read(2048)
+            mime_type = detect_mime_type(head)
+            if mime_type not in settings.ALLOWED_FILE_TYPES:
+                _reject(attachment, f'Type de fichier non autorisé: {mime_type}', mime_type)
+                return
+            if digest is not None:
+                # Pièce jointe hors blob: l'empreinte n'a pas été calculée à l'upload
+                digest.update(head)
+                for chunk in iter(lambda: fh.read(64 * 1024), b''):
+                    digest.update(chunk)
+
+            thumbnail = None
+            if mime_type in THUMBNAIL_MIME_TYPES:
+                fh.seek(0)
+                thumbnail = make_thumbnail(fh)
+
+        attachment.mime_type = mime_type
+        if digest is not None:
+            attachment.checksum = digest.hexdigest()
+        attachment.processing_status = 'ready'
+        attachment.processing_error = ''
+        fields = ['mime_type', 'checksum', 'processing_status', 'processing_error']
+        if thumbnail:
+            name = os.path.splitext(os.path.basename(attachment.file.name))[0]
+            attachment.thumbnail.save(f"{name}.png", ContentFile(thumbnail), save=False)
+            fields.append('thumbnail')
+        attachment.save(update_fields=fields)
+    except Exception as exc:
+        logger.exception("Échec du traitement de la pièce jointe %s", attachment_id)
+        Attachment.objects.filter(pk=attachment_id).update(
+            processing_status='rejected', processing_error=str(exc)
+        )
+
+
+def _copy_from_sibling(attachment):
+    """Reprend le résultat d'une pièce jointe déjà traitée ayant le même contenu"""
+    sibling = Attachment.objects.filter(
+        blob_id=attachment.blob_id, processing_status='ready'
+    ).exclude(pk=attachment.pk).only('mime_type', 'thumbnail').first()
+    if sibling is None:
+        return False
+    attachment.mime_type = sibling.mime_type
+    attachment.thumbnail = sibling.thumbnail.name or None
+    attachment.processing_status = 'ready'
+    attachment.processing_error = ''
+    attachment.save(update_fields=['mime_type', 'thumbnail', 'processing_status', 'processing_error'])
+    return True
+
+
+def _reject(attachment, reason, mime_type=''):
+    # Le fichier refusé n'est pas conservé
+    with transaction.atomic():
+        blob_id = attachment.blob_id
+        if blob_id:
+            attachment.blob = None
+            attachment.file = None
+        else:
+            attachment.file.delete(save=False)
+        attachment.mime_type = mime_type
+        attachment.processing_status = 'rejected'
+        attachment.processing_error = reason
+        attachment.save(update_fields=['blob', 'file', 'mime_type', 'processing_status', 'processing_error'])
+        if blob_id:
+            release_blob(blob_id)
+
+
+class AttachmentPipeline:
+    """
+    File locale + pool de threads pour le traitement des pièces jointes.
+
+    Avec ATTACHMENT_PROCESSING_SYNC = True (développement), le traitement a
+    lieu directement dans la requête.
+    """
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='attachments')
+
+    def submit(self, attachment_id):
+        self.executor.submit(self._run, attachment_id)
+
+    @staticmethod
+    def _run(attachment_id):
+        close_old_connections()
+        try:
+            process_attachment(attachment_id)
+        finally:
+            close_old_connections()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = AttachmentPipeline(getattr(settings, 'ATTACHMENT_PROCESSING_WORKERS', 2))
+    return _pipeline
+
+
+def enqueue_attachment(attachment_id):
+    """Planifie le traitement après le commit de la transaction courante"""
+    if getattr(settings, 'ATTACHMENT_PROCESSING_SYNC', False):
+        transaction.on_commit(lambda: process_attachment(attachment_id))
+    else:
+        transaction.on_commit(lambda: get_pipeline().submit(attachment_id))
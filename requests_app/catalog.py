@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Axis, ClassLevel, Field, Subject
+
+
+VERSION_CACHE_KEY = 'requests_app:reference-data:version'
+
+
+def build_reference_data():
+    """
+    Graphe complet niveaux / filières / axes / matières, liens M2M compris,
+    en six requêtes sans JOIN ni DISTINCT.
+    """
+    field_levels = defaultdict(list)
+    for field_id, level_id in Field.allowed_levels.through.objects.order_by(
+        'field_id', 'classlevel_id'
+    ).values_list('field_id', 'classlevel_id'):
+        field_levels[field_id].append(level_id)
+
+    subject_levels = defaultdict(list)
+    for subject_id, level_id in Subject.class_levels.through.objects.order_by(
+        'subject_id', 'classlevel_id'
+    ).values_list('subject_id', 'classlevel_id'):
+        subject_levels[subject_id].append(level_id)
+
+    return {
+        'class_levels': [
+            {'id': pk, 'name': name, 'order': order}
+            for pk, name, order in ClassLevel.objects.order_by('order', 'id').values_list('id', 'name', 'order')
+        ],
+        'fields': [
+            {'id': pk, 'code': code, 'name': name, 'level_ids': field_levels[pk]}
+            for pk, code, name in Field.objects.order_by('code').values_list('id', 'code', 'name')
+        ],
+        'axes': [
+            {'id': pk, 'code': code, 'name': name, 'field_id': field_id}
+            for pk, code, name, field_id in Axis.objects.order_by('field_id', 'code').values_list(
+                'id', 'code', 'name', 'field_id'
+            )
+        ],
+        'subjects': [
+            {'id': pk, 'code': code, 'name': name, 'field_id': field_id, 'level_ids': subject_levels[pk]}
+            for pk, code, name, field_id in Subject.objects.order_by('field_id', 'name', 'id').values_list(
+                'id', 'code', 'name', 'field_id'
+            )
+        ],
+    }
+
+
+class VersionedMemoryCache:
+    """
+    Valeur calculée une fois et gardée en mémoire jusqu'à invalidation.
+
+    Les signaux remplacent un jeton de version dans le cache Django: avec
+    un cache partagé (Redis, Memcached), tous les processus recalculent la
+    valeur après une modification; avec le LocMemCache par défaut, seul le
+    processus modifié est invalidé.
+    """
+
+    def __init__(self, version_key, build):
+        self.version_key = version_key
+        self.build = build
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def get(self):
+        version = cache.get_or_set(self.version_key, _new_version, timeout=None)
+        with self._lock:
+            if self._value is not None and self._version == version:
+                return self._value
+
+        value = self.build()
+        with self._lock:
+            self._version, self._value = version, value
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+        cache.set(self.version_key, _new_version(), timeout=None)
+
+
+def _new_version():
+    # Jeton aléatoire plutôt qu'un compteur: une clé évincée du cache ne
+    # peut pas retomber sur une version déjà vue
+    return uuid.uuid4().hex
+
+
+def render_reference_data():
+    """Référentiel rendu une fois: (JSON compact, ETag)"""
+    payload = json.dumps(build_reference_data(), separators=(',', ':'), ensure_ascii=False).encode()
+    return payload, f'"{hashlib.sha256(payload).hexdigest()[:32]}"'
+
+
+reference_data_cache = VersionedMemoryCache(VERSION_CACHE_KEY, render_reference_data)
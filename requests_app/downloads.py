@@ -0,0 +1,130 @@
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def attachment_response(request, attachment):
+    """
+    Réponse de téléchargement d'une pièce jointe.
+
+    ETag (empreinte SHA-256 du contenu) et Last-Modified permettent les GET
+    conditionnels (304). Le transfert des octets, Range compris, est
+    délégué au serveur frontal selon ATTACHMENT_SENDFILE_BACKEND.
+    """
+    etag = f'"{attachment.checksum}"' if attachment.checksum else None
+    last_modified = int(attachment.uploaded_at.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        backend = SENDFILE_BACKENDS[getattr(settings, 'ATTACHMENT_SENDFILE_BACKEND', 'nginx')]
+        response = backend(request, attachment, etag)
+        response['Content-Disposition'] = content_disposition_header(True, attachment.filename)
+
+    if etag:
+        response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def _content_type(attachment):
+    return attachment.mime_type or 'application/octet-stream'
+
+
+def _x_accel_redirect(request, attachment, etag):
+    """nginx: location interne (ATTACHMENT_SENDFILE_URL) pointant sur MEDIA_ROOT"""
+    response = HttpResponse(content_type=_content_type(attachment))
+    response['X-Accel-Redirect'] = quote(f"{settings.ATTACHMENT_SENDFILE_URL}{attachment.file.name}")
+    return response
+
+
+def _x_sendfile(request, attachment, etag):
+    """Apache (mod_xsendfile) et lighttpd: chemin absolu du fichier"""
+    response = HttpResponse(content_type=_content_type(attachment))
+    response['X-Sendfile'] = attachment.file.path
+    return response
+
+
+def _serve_from_django(request, attachment, etag):
+    """
+    Développement uniquement (pas de serveur frontal): Django sert le
+    fichier lui-même, avec la gestion de Range qu'aurait le serveur frontal.
+    """
+    size = attachment.file.size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            # Plages multiples ou en-tête invalide: fichier complet
+            byte_range = False
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    fh = attachment.file.open('rb')
+    if not byte_range:
+        response = FileResponse(fh, content_type=_content_type(attachment))
+    else:
+        start, end = byte_range
+        fh.seek(start)
+        response = StreamingHttpResponse(
+            _read_range(fh, end - start + 1), status=206, content_type=_content_type(attachment)
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def parse_range(header, size):
+    """
+    'bytes=0-499', 'bytes=500-' ou 'bytes=-500' -> (début, fin) inclusifs,
+    ou None si la plage n'est pas satisfiable. Une seule plage est gérée
+    (ValueError sinon).
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        raise ValueError(header)
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        raise ValueError(header)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _read_range(fh, length):
+    try:
+        while length > 0:
+            data = fh.read(min(COPY_BUFFER_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fh.close()
+
+
+SENDFILE_BACKENDS = {
+    'nginx': _x_accel_redirect,
+    'apache': _x_sendfile,
+    'django': _serve_from_django,
+}
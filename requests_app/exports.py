@@ -0,0 +1,93 @@
+import csv
+import json
+
+from django.db.models import OuterRef, Subquery
+
+from .models import AuditLog
+
+
+# (en-tête, expression values_list)
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('submitted_at', 'submitted_at'),
+    ('matricule', 'matricule'),
+    ('student_name', 'student_name'),
+    ('class_level', 'class_level__name'),
+    ('field', 'field__code'),
+    ('axis', 'axis__code'),
+    ('subject_code', 'subject__code'),
+    ('subject', 'subject__name'),
+    ('type', 'type'),
+    ('status', 'status'),
+    ('current_score', 'current_score'),
+    ('assigned_to', 'assigned_to__username'),
+    ('closed_at', 'closed_at'),
+    ('result_status', 'result__status'),
+    ('result_new_score', 'result__new_score'),
+    ('result_reason', 'result__reason'),
+    ('last_action', 'last_action'),
+    ('last_action_by', 'last_action_by'),
+    ('last_action_at', 'last_action_at'),
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Lignes à exporter (tuples), lues par paquets.
+
+    values_list évite l'instanciation des modèles; iterator() lit par
+    paquets de chunk_size et utilise un curseur côté serveur sur PostgreSQL,
+    d'où une mémoire constante quel que soit le volume.
+    """
+    latest_log = AuditLog.objects.filter(request=OuterRef('pk')).order_by('-timestamp', '-id')
+    queryset = queryset.annotate(
+        last_action=Subquery(latest_log.values('action')[:1]),
+        last_action_by=Subquery(latest_log.values('actor__username')[:1]),
+        last_action_at=Subquery(latest_log.values('timestamp')[:1]),
+    )
+    # select_related/prefetch_related sont inutiles pour values_list
+    queryset = queryset.select_related(None).prefetch_related(None)
+    return queryset.values_list(*[expr for _, expr in EXPORT_COLUMNS]).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """Pseudo-fichier: csv.writer renvoie directement la ligne formatée"""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def iter_jsonl(rows):
+    headers = [header for header, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(
+            {header: (_cell(value) if value is not None else None) for header, value in zip(headers, row)},
+            ensure_ascii=False
+        ) + '\n'
+
+
+def iter_export(queryset, export_format='csv', chunk_size=2000):
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    if export_format == 'jsonl':
+        return iter_jsonl(rows)
+    return iter_csv(rows)
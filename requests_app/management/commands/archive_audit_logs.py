@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from requests_app.partitions import (
+    ARCHIVE_SCHEMA, academic_year, archive_partition, archived_years, attached_years, ensure_partitions,
+    is_partitioned, partition_name, pending_requests, restore_partition, year_bounds
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintain the partitioned audit log (PostgreSQL): create upcoming academic-year partitions '
+        f'and move partitions older than --keep-years to the "{ARCHIVE_SCHEMA}" schema. Run it from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-years', type=int, default=2,
+            help='Academic years kept attached, current one included (default: 2)'
+        )
+        parser.add_argument('--years-ahead', type=int, default=1, help='Future partitions to create in advance')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Archive even when open or recently closed requests have logs in the partition'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only print what would be archived')
+        parser.add_argument('--restore', type=int, metavar='YEAR', help='Reattach an archived academic year')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('The audit log is not partitioned (PostgreSQL with migration 0011 required)')
+
+        if options['restore'] is not None:
+            self._restore(options['restore'])
+            return
+
+        if options['keep_years'] < 1:
+            raise CommandError('--keep-years must be at least 1')
+
+        if not options['dry_run']:
+            for year in ensure_partitions(options['years_ahead']):
+                self.stdout.write(f'✓ Partition {partition_name(year)} created')
+
+        # Une requête fermée avant le début de la première année conservée
+        # a tout son historique dans les partitions archivables
+        first_kept = academic_year(timezone.now()) - options['keep_years'] + 1
+        cutoff = year_bounds(first_kept)[0]
+
+        archived = 0
+        for year in attached_years():
+            if year >= first_kept:
+                continue
+            pending = pending_requests(year, cutoff)
+            if pending and not options['force']:
+                self.stdout.write(self.style.WARNING(
+                    f'  {partition_name(year)}: kept, {pending} request(s) open or closed after {cutoff:%Y-%m-%d}'
+                ))
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'  {partition_name(year)}: would be archived')
+                continue
+            archive_partition(year)
+            archived += 1
+            self.stdout.write(f'  {partition_name(year)}: moved to {ARCHIVE_SCHEMA}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {archived} partition(s) archived; attached: {attached_years()}, archived: {archived_years()}'
+        ))
+
+    def _restore(self, year):
+        if year not in archived_years():
+            raise CommandError(f'No archived partition for academic year {year}')
+        orphans = restore_partition(year)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {partition_name(year)} reattached ({orphans} log(s) of deleted requests dropped)'
+        ))
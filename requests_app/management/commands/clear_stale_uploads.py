@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from requests_app.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked upload sessions (and their partial files) that received nothing recently'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.CHUNKED_UPLOAD_EXPIRY_HOURS,
+            help='Expire sessions idle for more than this many hours'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # delete() envoie post_delete pour chaque session: les fichiers partiels suivent
+        deleted, _ = UploadSession.objects.filter(updated_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'✓ {deleted} stale upload session(s) deleted'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from requests_app.attachments import acquire_blob
+from requests_app.models import Attachment
+
+
+class Command(BaseCommand):
+    help = 'Move attachments uploaded before content-addressed storage into shared blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved')
+
+    def handle(self, *args, **options):
+        legacy = Attachment.objects.filter(blob__isnull=True).exclude(file='').order_by('pk')
+        self.stdout.write(f'{legacy.count()} legacy attachment(s)')
+        if options['dry_run']:
+            return
+
+        moved = missing = 0
+        for attachment in legacy.iterator():
+            old_file = attachment.file
+            if not old_file.storage.exists(old_file.name):
+                missing += 1
+                continue
+
+            with transaction.atomic():
+                with old_file.open('rb'):
+                    blob = acquire_blob(old_file)
+                old_name = old_file.name
+                attachment.blob = blob
+                attachment.file = blob.file.name
+                attachment.checksum = blob.checksum
+                attachment.save(update_fields=['blob', 'file', 'checksum'])
+                transaction.on_commit(lambda name=old_name: old_file.storage.delete(name))
+            moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {moved} moved, {missing} missing file(s) skipped'))
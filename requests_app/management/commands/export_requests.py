@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from requests_app.exports import EXPORT_FORMATS, iter_export
+from requests_app.models import Request
+from requests_app.roles import load_user_roles, requests_visible_to
+
+
+class Command(BaseCommand):
+    help = 'Stream requests (with result and latest audit entry) to CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+        parser.add_argument('--as-user', help='Restrict to the requests visible to this username')
+        parser.add_argument('--status', help='Only export requests with this status')
+        parser.add_argument('--since', help='Only export requests submitted on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = Request.objects.order_by('submitted_at', 'id')
+
+        if options['as_user']:
+            try:
+                user = User.objects.get(username=options['as_user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user: {options['as_user']}")
+            queryset = requests_visible_to(load_user_roles(user), queryset)
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['since']:
+            queryset = queryset.filter(submitted_at__date__gte=options['since'])
+
+        chunks = iter_export(queryset, options['output_format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"✓ Export written to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
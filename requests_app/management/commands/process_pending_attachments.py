@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from requests_app.attachments import process_attachment
+from requests_app.models import Attachment
+
+
+class Command(BaseCommand):
+    help = 'Process attachments left pending (e.g. after a restart emptied the in-process queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-stuck', action='store_true',
+            help='Also retry attachments stuck in the processing state'
+        )
+
+    def handle(self, *args, **options):
+        if options['include_stuck']:
+            Attachment.objects.filter(processing_status='processing').update(processing_status='pending')
+
+        ids = list(Attachment.objects.filter(processing_status='pending').values_list('pk', flat=True))
+        self.stdout.write(f'Processing {len(ids)} attachment(s)...')
+        for attachment_id in ids:
+            process_attachment(attachment_id)
+        self.stdout.write(self.style.SUCCESS('✓ Done'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from requests_app.routing import apply_rebalance, plan_rebalance
+from requests_app.workload import OPEN_STATUSES, rebuild_workloads
+
+
+class Command(BaseCommand):
+    help = 'Spread the existing backlog of open requests across eligible lecturers / HODs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status', action='append', choices=OPEN_STATUSES, dest='statuses',
+            help="Statuses that may be moved (repeatable, default: sent)"
+        )
+        parser.add_argument('--recount', action='store_true', help='Rebuild workload counters first')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the planned moves')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(f'✓ {rebuild_workloads()} workload counter(s) rebuilt')
+
+        moves = plan_rebalance(options['statuses'] or ['sent'])
+        for req, from_user_id, to_user_id in moves:
+            self.stdout.write(f'  {req.pk}: {from_user_id} -> {to_user_id}')
+
+        if options['dry_run']:
+            self.stdout.write(f'{len(moves)} move(s) planned (dry run)')
+            return
+
+        applied = apply_rebalance(moves)
+        self.stdout.write(self.style.SUCCESS(f'✓ {applied} request(s) reassigned'))
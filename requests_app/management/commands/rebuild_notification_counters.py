@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from requests_app.notifications import rebuild_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized unread notification counters from the notifications table'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding unread notification counters...')
+        updated = rebuild_unread_counts()
+        self.stdout.write(self.style.SUCCESS(f'✓ {updated} counter(s) rebuilt'))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    Notification = apps.get_model('requests_app', 'Notification')
+    NotificationCounter = apps.get_model('requests_app', 'NotificationCounter')
+    unread = (
+        Notification.objects.filter(read=False)
+        .values('user_id')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    NotificationCounter.objects.bulk_create([
+        NotificationCounter(user_id=row['user_id'], unread=row['total'])
+        for row in unread
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('requests_app', '0003_lecturer_cellule_informatique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread', models.PositiveIntegerField(default=0, verbose_name='Non lues')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_counter', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Compteur de notifications',
+                'verbose_name_plural': 'Compteurs de notifications',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
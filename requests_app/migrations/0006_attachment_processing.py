@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:15
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Les pièces jointes existantes ont déjà été validées lors de l'upload synchrone
+    Attachment = apps.get_model('requests_app', 'Attachment')
+    Attachment.objects.update(processing_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0005_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Empreinte SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='processing_error',
+            field=models.TextField(blank=True, verbose_name='Erreur de traitement'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours de traitement'), ('ready', 'Prête'), ('rejected', 'Rejetée')], default='pending', max_length=20, verbose_name='État du traitement'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='thumbnails/%Y/%m/%d/', verbose_name='Miniature'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
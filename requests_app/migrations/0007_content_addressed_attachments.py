@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import requests_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0006_attachment_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=64, unique=True, verbose_name='Empreinte SHA-256')),
+                ('file', models.FileField(max_length=255, upload_to=requests_app.models.blob_upload_to, verbose_name='Fichier')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Taille (octets)')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Nombre de références')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+            ],
+            options={
+                'verbose_name': 'Contenu de pièce jointe',
+                'verbose_name_plural': 'Contenus de pièces jointes',
+            },
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='requests_app.attachmentblob', verbose_name='Contenu'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('requests_app', '0007_content_addressed_attachments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Nom du fichier')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Taille annoncée (octets)')),
+                ('received', models.PositiveBigIntegerField(default=0, verbose_name='Octets reçus')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Dernier morceau reçu')),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='requests_app.request', verbose_name='Requête')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Uploadé par')),
+            ],
+            options={
+                'verbose_name': 'Upload en cours',
+                'verbose_name_plural': 'Uploads en cours',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+OPEN_STATUSES = ['sent', 'received', 'approved', 'in_cellule', 'returned']
+
+
+def populate_workloads(apps, schema_editor):
+    Request = apps.get_model('requests_app', 'Request')
+    Workload = apps.get_model('requests_app', 'Workload')
+    counts = (
+        Request.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+        .values('assigned_to_id')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    Workload.objects.bulk_create([
+        Workload(user_id=row['assigned_to_id'], open_requests=row['total'])
+        for row in counts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('requests_app', '0008_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Workload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_requests', models.PositiveIntegerField(default=0, verbose_name='Requêtes ouvertes')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='workload', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Charge de travail',
+                'verbose_name_plural': 'Charges de travail',
+            },
+        ),
+        migrations.RunPython(populate_workloads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+
+# Journal d'audit partitionné par année universitaire (1er septembre),
+# PostgreSQL uniquement: sur les autres bases la migration ne fait rien.
+# La clé primaire devient (id, timestamp), la clé de partition devant en
+# faire partie; l'état Django (clé primaire id) est inchangé, id restant
+# unique par sa séquence.
+TABLE = 'requests_app_auditlog'
+UNPARTITIONED = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{TABLE}_id_seq'
+START_MONTH = 9
+COLUMNS = 'id, action, from_status, to_status, "timestamp", note, actor_id, request_id'
+
+
+def academic_year(moment):
+    return moment.year if moment.month >= START_MONTH else moment.year - 1
+
+
+def bounds_sql(year):
+    start = datetime(year, START_MONTH, 1, tzinfo=timezone.utc)
+    end = datetime(year + 1, START_MONTH, 1, tzinfo=timezone.utc)
+    return f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def partition_audit_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+
+    execute(f'ALTER TABLE {TABLE} RENAME TO {UNPARTITIONED}')
+    execute(f'ALTER INDEX IF EXISTS auditlog_request_idx RENAME TO auditlog_request_idx_unpartitioned')
+    # Colonne IDENTITY (Django >= 4.1) ou serial: la séquence est recréée
+    # à part, les colonnes IDENTITY n'étant pas gérées sur une table
+    # partitionnée avant PostgreSQL 17
+    execute(f'ALTER TABLE {UNPARTITIONED} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+    execute(f'ALTER TABLE {UNPARTITIONED} ALTER COLUMN id DROP DEFAULT')
+    execute(f'DROP SEQUENCE IF EXISTS {SEQUENCE}')
+
+    execute(f'CREATE SEQUENCE {SEQUENCE}')
+    execute(f'''
+        CREATE TABLE {TABLE} (
+            id bigint NOT NULL DEFAULT nextval('{SEQUENCE}'),
+            action varchar(100) NOT NULL,
+            from_status varchar(50) NULL,
+            to_status varchar(50) NULL,
+            "timestamp" timestamp with time zone NOT NULL,
+            note text NULL,
+            actor_id integer NULL REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+            request_id uuid NOT NULL REFERENCES requests_app_request (id) DEFERRABLE INITIALLY DEFERRED,
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    ''')
+    execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+    execute(f'CREATE INDEX auditlog_request_idx ON {TABLE} (request_id, "timestamp" DESC, id DESC)')
+    execute(f'CREATE INDEX {TABLE}_actor_id ON {TABLE} (actor_id)')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min("timestamp") FROM {UNPARTITIONED}')
+        oldest = cursor.fetchone()[0]
+    current = academic_year(datetime.now(timezone.utc))
+    first = academic_year(oldest) if oldest else current
+    for year in range(first, current + 2):
+        execute(f'CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} FOR VALUES {bounds_sql(year)}')
+    execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+    execute(f'INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {UNPARTITIONED}')
+    execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+    execute(f'DROP TABLE {UNPARTITIONED}')
+
+
+def unpartition_audit_log(apps, schema_editor):
+    """Retour à une table simple (les partitions archivées ne sont pas reprises)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+
+    execute(f'ALTER TABLE {TABLE} RENAME TO {UNPARTITIONED}')
+    execute(f'ALTER INDEX auditlog_request_idx RENAME TO auditlog_request_idx_unpartitioned')
+    execute(f'''
+        CREATE TABLE {TABLE} (
+            id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+            action varchar(100) NOT NULL,
+            from_status varchar(50) NULL,
+            to_status varchar(50) NULL,
+            "timestamp" timestamp with time zone NOT NULL,
+            note text NULL,
+            actor_id integer NULL REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+            request_id uuid NOT NULL REFERENCES requests_app_request (id) DEFERRABLE INITIALLY DEFERRED
+        )
+    ''')
+    execute(f'CREATE INDEX auditlog_request_idx ON {TABLE} (request_id, "timestamp" DESC, id DESC)')
+    execute(f'CREATE INDEX {TABLE}_actor_id ON {TABLE} (actor_id)')
+    execute(f'INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {UNPARTITIONED}')
+    execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f"COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+    )
+    execute(f'DROP TABLE {UNPARTITIONED} CASCADE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requests_app', '0010_request_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_audit_log, unpartition_audit_log),
+    ]
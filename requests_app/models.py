@@ -1,3 +1,4 @@
+import os
 import uuid
 from django.conf import settings
 from django.db import models
@@ -250,11 +251,30 @@ class Request(models.Model):
         blank=True,
         verbose_name="Date de clôture"
     )
+    # Incrémentée à chaque modification: les UPDATE conditionnels
+    # (WHERE version = <version lue>) détectent les écritures concurrentes
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Version"
+    )
 
     class Meta:
         verbose_name = "Requête"
         verbose_name_plural = "Requêtes"
         ordering = ['-submitted_at']
+        # Un index par chemin d'accès de RequestViewSet.get_queryset (filtre du
+        # rôle puis tri -submitted_at, id départageant pour la pagination par curseur)
+        indexes = [
+            models.Index(fields=['student', '-submitted_at', '-id'], name='request_student_idx'),
+            models.Index(fields=['field', '-submitted_at', '-id'], name='request_field_idx'),
+            models.Index(fields=['assigned_to', '-submitted_at', '-id'], name='request_assigned_idx'),
+            models.Index(
+                fields=['-submitted_at', '-id'],
+                name='request_in_cellule_idx',
+                condition=models.Q(status='in_cellule')
+            ),
+            models.Index(fields=['-submitted_at', '-id'], name='request_submitted_idx'),
+        ]
 
     def __str__(self):
         return f"Requête {self.id} - {self.subject.name} - {self.matricule}"
@@ -313,8 +333,59 @@ class RequestResult(models.Model):
         return f"Résultat {self.get_status_display()} pour {self.request.id}"
 
 
+def blob_upload_to(instance, filename):
+    """Chemin adressé par le contenu: blobs/ab/cd/<sha256><extension>"""
+    extension = os.path.splitext(filename)[1].lower()
+    return f"blobs/{instance.checksum[:2]}/{instance.checksum[2:4]}/{instance.checksum}{extension}"
+
+
+class AttachmentBlob(models.Model):
+    """
+    Contenu d'un fichier stocké une seule fois, identifié par son SHA-256.
+
+    Plusieurs pièces jointes identiques partagent le même blob; ref_count
+    compte les pièces jointes qui le référencent et le fichier n'est
+    supprimé qu'à zéro.
+    """
+    checksum = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="Empreinte SHA-256"
+    )
+    file = models.FileField(
+        upload_to=blob_upload_to,
+        max_length=255,
+        verbose_name="Fichier"
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name="Taille (octets)"
+    )
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Nombre de références"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Date de création"
+    )
+
+    class Meta:
+        verbose_name = "Contenu de pièce jointe"
+        verbose_name_plural = "Contenus de pièces jointes"
+
+    def __str__(self):
+        return f"{self.checksum[:12]} ({self.ref_count} réf.)"
+
+
 class Attachment(models.Model):
     """Modèle pour les pièces jointes"""
+    PROCESSING_STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours de traitement'),
+        ('ready', 'Prête'),
+        ('rejected', 'Rejetée'),
+    ]
+
     request = models.ForeignKey(
         Request,
         on_delete=models.CASCADE,
@@ -327,6 +398,14 @@ class Attachment(models.Model):
         null=True,
         verbose_name="Uploadé par"
     )
+    blob = models.ForeignKey(
+        AttachmentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='attachments',
+        verbose_name="Contenu"
+    )
     file = models.FileField(
         upload_to='requests/%Y/%m/%d/',
         verbose_name="Fichier"
@@ -349,6 +428,27 @@ class Attachment(models.Model):
         auto_now_add=True,
         verbose_name="Date d'upload"
     )
+    processing_status = models.CharField(
+        max_length=20,
+        choices=PROCESSING_STATUS_CHOICES,
+        default='pending',
+        verbose_name="État du traitement"
+    )
+    processing_error = models.TextField(
+        blank=True,
+        verbose_name="Erreur de traitement"
+    )
+    checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Empreinte SHA-256"
+    )
+    thumbnail = models.ImageField(
+        upload_to='thumbnails/%Y/%m/%d/',
+        null=True,
+        blank=True,
+        verbose_name="Miniature"
+    )
 
     class Meta:
         verbose_name = "Pièce jointe"
@@ -359,8 +459,69 @@ class Attachment(models.Model):
         return f"{self.filename} - {self.request.id}"
 
 
+class UploadSession(models.Model):
+    """
+    Upload d'une pièce jointe en plusieurs morceaux, pouvant être repris
+    après une coupure. Les morceaux sont assemblés dans un fichier
+    temporaire (CHUNKED_UPLOAD_DIR) jusqu'à la finalisation.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    request = models.ForeignKey(
+        Request,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name="Requête"
+    )
+    uploaded_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        verbose_name="Uploadé par"
+    )
+    filename = models.CharField(
+        max_length=255,
+        verbose_name="Nom du fichier"
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name="Taille annoncée (octets)"
+    )
+    received = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Octets reçus"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Date de création"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Dernier morceau reçu"
+    )
+
+    class Meta:
+        verbose_name = "Upload en cours"
+        verbose_name_plural = "Uploads en cours"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{self.pk}.part")
+
+
 class AuditLog(models.Model):
-    """Modèle pour l'historique des actions"""
+    """
+    Modèle pour l'historique des actions
+
+    Sous PostgreSQL, la table est partitionnée par année universitaire
+    (migration 0011, clé primaire (id, timestamp)); voir partitions.py.
+    """
     request = models.ForeignKey(
         Request,
         on_delete=models.CASCADE,
@@ -403,6 +564,9 @@ class AuditLog(models.Model):
         verbose_name = "Journal d'audit"
         verbose_name_plural = "Journaux d'audit"
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['request', '-timestamp', '-id'], name='auditlog_request_idx'),
+        ]
 
     def __str__(self):
         return f"{self.action} - {self.request.id} - {self.timestamp}"
@@ -442,6 +606,56 @@ class Notification(models.Model):
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_idx'),
+            models.Index(
+                fields=['user', '-created_at'],
+                name='notification_unread_idx',
+                condition=models.Q(read=False)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+
+
+class NotificationCounter(models.Model):
+    """Compteur dénormalisé des notifications non lues d'un utilisateur"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_counter',
+        verbose_name="Utilisateur"
+    )
+    unread = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Non lues"
+    )
+
+    class Meta:
+        verbose_name = "Compteur de notifications"
+        verbose_name_plural = "Compteurs de notifications"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread}"
+
+
+class Workload(models.Model):
+    """Nombre dénormalisé de requêtes ouvertes assignées à un utilisateur"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='workload',
+        verbose_name="Utilisateur"
+    )
+    open_requests = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Requêtes ouvertes"
+    )
+
+    class Meta:
+        verbose_name = "Charge de travail"
+        verbose_name_plural = "Charges de travail"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.open_requests}"
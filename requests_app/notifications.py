@@ -0,0 +1,228 @@
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .broker import get_broker, user_channel
+from .models import Notification, NotificationCounter
+
+
+class NotificationBatch:
+    """
+    Accumule des notifications et les insère en un seul bulk_create.
+
+    Par défaut l'insertion est différée jusqu'au commit de la transaction
+    courante (immédiate si aucune transaction n'est ouverte), de sorte
+    qu'une transition annulée n'envoie aucune notification.
+    """
+
+    def __init__(self):
+        self.notifications = []
+
+    def __len__(self):
+        return len(self.notifications)
+
+    def add(self, user, title, body, link=None):
+        """Ajoute une notification pour un utilisateur (instance ou id)"""
+        user_id = getattr(user, 'pk', user)
+        if user_id is None:
+            return
+        self.notifications.append(
+            Notification(user_id=user_id, title=title, body=body, link=link)
+        )
+
+    def add_to_group(self, group_name, title, body, link=None):
+        """Ajoute une notification pour chaque membre d'un groupe (une seule requête)"""
+        for user_id in group_member_ids(group_name):
+            self.add(user_id, title, body, link)
+
+    def send(self, defer=True):
+        notifications, self.notifications = self.notifications, []
+        if not notifications:
+            return
+        if defer:
+            transaction.on_commit(lambda: _insert(notifications))
+        else:
+            _insert(notifications)
+
+
+def group_member_ids(group_name):
+    """Identifiants des membres d'un groupe"""
+    return list(User.objects.filter(groups__name=group_name).values_list('pk', flat=True))
+
+
+def _insert(notifications):
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications)
+        count_created(notifications)
+
+
+def count_created(notifications):
+    """
+    Prend en compte des notifications non lues déjà insérées: compteurs
+    incrémentés, événements publiés au commit
+    """
+    increments = Counter(notification.user_id for notification in notifications if not notification.read)
+    adjust_unread_counts(increments)
+    transaction.on_commit(lambda: _publish_created(notifications))
+
+
+def _publish_created(notifications):
+    broker = get_broker()
+    for notification in notifications:
+        broker.publish(user_channel(notification.user_id), {
+            'type': 'created',
+            'notification': notification_payload(notification),
+            'unread_delta': 0 if notification.read else 1,
+        })
+
+
+def publish_change(user_id, event_type, unread_delta, notification_ids=None):
+    """
+    Signale aux clients connectés des notifications lues ('read'), remises
+    à non lues ('unread') ou supprimées ('deleted')
+    """
+    get_broker().publish(user_channel(user_id), {
+        'type': event_type,
+        'ids': list(notification_ids) if notification_ids is not None else None,
+        'unread_delta': unread_delta,
+    })
+
+
+def publish_read(user_id, count, notification_ids=None):
+    """Signale aux clients connectés que des notifications ont été lues"""
+    if count:
+        publish_change(user_id, 'read', -count, notification_ids)
+
+
+def set_notification_read(notification, read):
+    """
+    Passe une notification à lue ou non lue par un UPDATE conditionnel
+    (WHERE read = <ancienne valeur>): le compteur n'est ajusté et
+    l'événement publié au commit que si la ligne a effectivement changé,
+    même si deux bascules concurrentes ont lu la même valeur. Retourne
+    True dans ce cas.
+    """
+    with transaction.atomic():
+        changed = Notification.objects.filter(pk=notification.pk, read=not read).update(read=read)
+        notification.read = read
+        if changed:
+            delta = -1 if read else 1
+            adjust_unread_counts({notification.user_id: delta})
+            transaction.on_commit(
+                lambda: publish_change(notification.user_id, 'read' if read else 'unread', delta, [notification.pk])
+            )
+    return bool(changed)
+
+
+def delete_notifications(queryset):
+    """
+    Supprime des notifications, décrémente les compteurs de celles qui
+    étaient non lues et publie un événement par utilisateur. Retourne le
+    nombre de notifications supprimées.
+    """
+    with transaction.atomic():
+        rows = list(queryset.select_for_update().values_list('pk', 'user_id', 'read'))
+        if not rows:
+            return 0
+        Notification.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+
+        ids = defaultdict(list)
+        unread = Counter()
+        for pk, user_id, read in rows:
+            ids[user_id].append(pk)
+            if not read:
+                unread[user_id] += 1
+        adjust_unread_counts({user_id: -count for user_id, count in unread.items()})
+        transaction.on_commit(lambda: _publish_deleted(ids, unread))
+    return len(rows)
+
+
+def _publish_deleted(ids, unread):
+    for user_id, notification_ids in ids.items():
+        publish_change(user_id, 'deleted', -unread[user_id], notification_ids)
+
+
+def adjust_unread_counts(deltas):
+    """
+    Applique des variations {user_id: delta} aux compteurs de non lues.
+
+    Les compteurs manquants sont créés, puis les utilisateurs ayant la même
+    variation sont mis à jour ensemble par un UPDATE atomique (F()).
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in deltas],
+        ignore_conflicts=True
+    )
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=Greatest(F('unread') + delta, 0)
+        )
+
+
+def get_unread_count(user_id):
+    """Lecture O(1) du compteur de non lues"""
+    unread = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+    return unread or 0
+
+
+def mark_notifications_read(user_id, queryset, notification_ids=None):
+    """
+    Marque comme lues les notifications non lues du queryset par un seul UPDATE,
+    décrémente le compteur d'autant et publie l'événement. Retourne le nombre
+    de notifications effectivement passées à lues.
+    """
+    with transaction.atomic():
+        count = queryset.filter(user_id=user_id, read=False).update(read=True)
+        if count:
+            adjust_unread_counts({user_id: -count})
+            transaction.on_commit(lambda: publish_read(user_id, count, notification_ids))
+    return count
+
+
+def rebuild_unread_counts():
+    """Recalcule tous les compteurs depuis la table des notifications"""
+    with transaction.atomic():
+        unread = dict(
+            Notification.objects.filter(read=False)
+            .values_list('user_id')
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        NotificationCounter.objects.exclude(user_id__in=unread).exclude(unread=0).update(unread=0)
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id) for user_id in unread],
+            ignore_conflicts=True
+        )
+        counters = list(NotificationCounter.objects.filter(user_id__in=unread))
+        for counter in counters:
+            counter.unread = unread[counter.user_id]
+        NotificationCounter.objects.bulk_update(counters, ['unread'], batch_size=1000)
+    return len(counters)
+
+
+def notification_payload(notification):
+    """Même forme que NotificationSerializer, sans dépendre des serializers"""
+    return {
+        'id': notification.pk,
+        'title': notification.title,
+        'body': notification.body,
+        'link': notification.link,
+        'read': notification.read,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def notify(user, title, body, link=None, defer=True):
+    """Raccourci pour une notification unique"""
+    batch = NotificationBatch()
+    batch.add(user, title, body, link)
+    batch.send(defer=defer)
@@ -0,0 +1,157 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur (keyset) sur un couple (date, id).
+
+    Chaque page est obtenue par un WHERE sur la dernière ligne de la page
+    précédente, sans COUNT(*) ni OFFSET: le coût d'une page profonde est le
+    même que celui de la première.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    # Tri imposé en mode curseur; le second champ départage les égalités
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self._after(queryset.model, self.decode_cursor(encoded)))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, name.lstrip('-')) for name in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def encode_cursor(self, values):
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return values
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Curseur invalide')
+
+    def _after(self, model, values):
+        """Condition « strictement après le curseur » dans l'ordre de tri"""
+        first, second = self.ordering
+        first_name, second_name = first.lstrip('-'), second.lstrip('-')
+        first_op = 'lt' if first.startswith('-') else 'gt'
+        second_op = 'lt' if second.startswith('-') else 'gt'
+
+        first_value = parse_datetime(values[0])
+        if first_value is None:
+            raise NotFound('Curseur invalide')
+        try:
+            second_value = model._meta.get_field(second_name).to_python(values[1])
+        except Exception:
+            raise NotFound('Curseur invalide')
+
+        # La borne large sur la première colonne (<= ou >=) rend la condition
+        # utilisable comme plage d'index: sans elle, l'OR seul fait parcourir
+        # l'index depuis le début et une page profonde coûte plus cher
+        return Q(**{f'{first_name}__{first_op}e': first_value}) & (
+            Q(**{f'{first_name}__{first_op}': first_value}) |
+            Q(**{first_name: first_value, f'{second_name}__{second_op}': second_value})
+        )
+
+
+class SelectablePagination(PageNumberPagination):
+    """
+    Pagination par numéro de page par défaut (admin, tableaux paginés), ou par
+    curseur si la requête passe ?cursor=... ou ?pagination=cursor.
+    """
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params or \
+                request.query_params.get('pagination') == 'cursor':
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+
+class RequestKeysetPagination(KeysetPagination):
+    ordering = ('-submitted_at', '-id')
+
+
+class NotificationKeysetPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class AuditLogKeysetPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class RequestPagination(SelectablePagination):
+    keyset_class = RequestKeysetPagination
+
+
+class NotificationPagination(SelectablePagination):
+    keyset_class = NotificationKeysetPagination
+
+
+class AuditLogPagination(SelectablePagination):
+    keyset_class = AuditLogKeysetPagination
@@ -0,0 +1,175 @@
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# Table partitionnée par année universitaire (migration 0011, PostgreSQL)
+AUDIT_LOG_TABLE = 'requests_app_auditlog'
+DEFAULT_PARTITION = f'{AUDIT_LOG_TABLE}_default'
+ARCHIVE_SCHEMA = 'audit_archive'
+
+# Une année universitaire va du 1er septembre au 31 août
+ACADEMIC_YEAR_START_MONTH = 9
+
+_PARTITION_NAME = re.compile(rf'^{AUDIT_LOG_TABLE}_y(\d{{4}})$')
+
+
+def academic_year(moment):
+    """Année universitaire (année de la rentrée) d'une date"""
+    return moment.year if moment.month >= ACADEMIC_YEAR_START_MONTH else moment.year - 1
+
+
+def year_bounds(year):
+    """Bornes [début, fin) de l'année universitaire, en UTC"""
+    return (
+        datetime(year, ACADEMIC_YEAR_START_MONTH, 1, tzinfo=dt_timezone.utc),
+        datetime(year + 1, ACADEMIC_YEAR_START_MONTH, 1, tzinfo=dt_timezone.utc),
+    )
+
+
+def partition_name(year):
+    return f'{AUDIT_LOG_TABLE}_y{year}'
+
+
+def is_partitioned():
+    """Vrai si le journal d'audit est une table partitionnée (PostgreSQL uniquement)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))',
+            [AUDIT_LOG_TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def _years(names):
+    years = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def attached_years():
+    """Années universitaires dont la partition est attachée au journal"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [AUDIT_LOG_TABLE]
+        )
+        return _years(name for name, in cursor.fetchall())
+
+
+def archived_years():
+    """Années universitaires dont la partition a été archivée"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT tablename FROM pg_tables WHERE schemaname = %s', [ARCHIVE_SCHEMA])
+        return _years(name for name, in cursor.fetchall())
+
+
+def _bounds_sql(year):
+    start, end = year_bounds(year)
+    return f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def create_partition(year):
+    """
+    Crée la partition d'une année. Les lignes de cette année déjà tombées
+    dans la partition par défaut y sont déplacées (PostgreSQL refuse sinon
+    de créer la partition).
+    """
+    name = partition_name(year)
+    start, end = year_bounds(year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [start, end]
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE {name} PARTITION OF {AUDIT_LOG_TABLE} FOR VALUES {_bounds_sql(year)}')
+            return
+
+        cursor.execute(f'ALTER TABLE {AUDIT_LOG_TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {AUDIT_LOG_TABLE} FOR VALUES {_bounds_sql(year)}')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s '
+            f'RETURNING *) INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(f'ALTER TABLE {AUDIT_LOG_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+
+
+def ensure_partitions(years_ahead=1):
+    """Crée les partitions manquantes de l'année en cours et des suivantes; retourne les années créées"""
+    current = academic_year(timezone.now())
+    existing = set(attached_years()) | set(archived_years())
+    created = []
+    for year in range(current, current + years_ahead + 1):
+        if year not in existing:
+            create_partition(year)
+            created.append(year)
+    return created
+
+
+def pending_requests(year, cutoff):
+    """
+    Requêtes ayant des journaux dans la partition de l'année et encore
+    ouvertes (ou fermées après cutoff): leur historique serait coupé en deux
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT count(DISTINCT log.request_id) FROM {partition_name(year)} log '
+            'JOIN requests_app_request req ON req.id = log.request_id '
+            'WHERE req.closed_at IS NULL OR req.closed_at >= %s',
+            [cutoff]
+        )
+        return cursor.fetchone()[0]
+
+
+def archive_partition(year):
+    """
+    Détache la partition de l'année et la range dans le schéma d'archive.
+    Les requêtes sur request.logs ne la parcourent plus. Ses clés
+    étrangères sont supprimées: une requête archivée reste supprimable.
+    """
+    name = partition_name(year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {AUDIT_LOG_TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}')
+        cursor.execute(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}')
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [f'{ARCHIVE_SCHEMA}.{name}']
+        )
+        for constraint, in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.{name} DROP CONSTRAINT {constraint}')
+
+
+def restore_partition(year):
+    """
+    Rattache une partition archivée. Les journaux des requêtes supprimées
+    depuis sont effacés, puis PostgreSQL revalide les clés étrangères du
+    journal. Retourne le nombre de journaux effacés.
+    """
+    name = partition_name(year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {ARCHIVE_SCHEMA}.{name} log '
+            'WHERE NOT EXISTS (SELECT 1 FROM requests_app_request req WHERE req.id = log.request_id)'
+        )
+        orphans = cursor.rowcount
+        cursor.execute(
+            f'UPDATE {ARCHIVE_SCHEMA}.{name} log SET actor_id = NULL '
+            'WHERE actor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM auth_user u WHERE u.id = log.actor_id)'
+        )
+        cursor.execute('SELECT current_schema()')
+        schema = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.{name} SET SCHEMA {schema}')
+        cursor.execute(f'ALTER TABLE {AUDIT_LOG_TABLE} ATTACH PARTITION {name} FOR VALUES {_bounds_sql(year)}')
+    return orphans
@@ -1,12 +1,14 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .roles import get_request_roles
+
 
 class IsStudent(BasePermission):
     """
     Permission pour vérifier si l'utilisateur est un étudiant
     """
     def has_permission(self, request, view):
-        return hasattr(request.user, 'student_profile')
+        return get_request_roles(request).is_student
 
 
 class IsLecturer(BasePermission):
@@ -14,7 +16,7 @@ class IsLecturer(BasePermission):
     Permission pour vérifier si l'utilisateur est un enseignant
     """
     def has_permission(self, request, view):
-        return hasattr(request.user, 'lecturer_profile')
+        return get_request_roles(request).is_lecturer
 
 
 class IsHOD(BasePermission):
@@ -22,9 +24,7 @@ class IsHOD(BasePermission):
     Permission pour vérifier si l'utilisateur est HOD (Chef de département)
     """
     def has_permission(self, request, view):
-        if not hasattr(request.user, 'lecturer_profile'):
-            return False
-        return request.user.lecturer_profile.is_hod
+        return get_request_roles(request).is_hod
 
 
 class IsCellule(BasePermission):
@@ -32,7 +32,8 @@ class IsCellule(BasePermission):
     Permission pour vérifier si l'utilisateur fait partie de la cellule informatique
     """
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='cellule_informatique').exists() or request.user.is_superuser
+        roles = get_request_roles(request)
+        return roles.in_cellule_group or roles.is_superuser
 
 
 class IsSuperAdmin(BasePermission):
@@ -49,22 +50,21 @@ class IsAssignedStaff(BasePermission):
     """
     def has_permission(self, request, view):
         # Permettre si staff (lecturer ou admin)
-        return (hasattr(request.user, 'lecturer_profile') or
-                request.user.is_superuser)
+        roles = get_request_roles(request)
+        return roles.is_lecturer or roles.is_superuser
 
     def has_object_permission(self, request, view, obj):
         # obj est une Request
-        if request.user.is_superuser:
+        roles = get_request_roles(request)
+        if roles.is_superuser:
             return True
 
         # HOD peut voir toutes les requêtes de sa filière
-        if hasattr(request.user, 'lecturer_profile'):
-            lecturer = request.user.lecturer_profile
-            if lecturer.is_hod and lecturer.field == obj.field:
-                return True
+        if roles.is_hod_of(obj):
+            return True
 
         # Vérifier si assigné à cette requête
-        return obj.assigned_to == request.user
+        return roles.is_assigned_to(obj)
 
 
 class IsRequestOwnerOrAssigned(BasePermission):
@@ -75,27 +75,28 @@ class IsRequestOwnerOrAssigned(BasePermission):
         return request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
+        roles = get_request_roles(request)
+
         # Admin peut tout voir
-        if request.user.is_superuser:
+        if roles.is_superuser:
             return True
 
         # L'étudiant propriétaire peut voir sa requête
-        if hasattr(request.user, 'student_profile'):
-            return obj.student.user == request.user
+        if roles.is_student:
+            return roles.owns(obj)
 
         # Staff assigné peut voir
-        if hasattr(request.user, 'lecturer_profile'):
+        if roles.is_lecturer:
             # HOD peut voir toutes les requêtes de sa filière
-            lecturer = request.user.lecturer_profile
-            if lecturer.is_hod and lecturer.field == obj.field:
+            if roles.is_hod_of(obj):
                 return True
 
             # Assigné directement
-            if obj.assigned_to == request.user:
+            if roles.is_assigned_to(obj):
                 return True
 
         # Cellule peut voir les requêtes in_cellule
-        if request.user.groups.filter(name='cellule_informatique').exists():
+        if roles.in_cellule_group:
             return obj.status == 'in_cellule'
 
         return False
@@ -107,28 +108,29 @@ class CanEditRequest(BasePermission):
     Ou staff assigné peut mettre à jour current_score
     """
     def has_object_permission(self, request, view, obj):
+        roles = get_request_roles(request)
+
         # Admin peut toujours modifier
-        if request.user.is_superuser:
+        if roles.is_superuser:
             return True
 
         # Staff assigné peut mettre à jour current_score
-        if hasattr(request.user, 'lecturer_profile'):
+        if roles.is_lecturer:
             # HOD peut modifier les requêtes de sa filière
-            lecturer = request.user.lecturer_profile
-            if lecturer.is_hod and lecturer.field == obj.field:
+            if roles.is_hod_of(obj):
                 # Allow updating current_score only
                 if request.method == 'PATCH' and 'current_score' in request.data:
                     return True
-            
+
             # Staff assigné peut mettre à jour current_score
-            if obj.assigned_to == request.user:
+            if roles.is_assigned_to(obj):
                 # Allow updating current_score only
                 if request.method == 'PATCH' and 'current_score' in request.data:
                     return True
 
         # L'étudiant propriétaire peut modifier si status='sent'
-        if hasattr(request.user, 'student_profile'):
-            if obj.student.user == request.user:
+        if roles.is_student:
+            if roles.owns(obj):
                 return obj.can_edit()
 
         return False
@@ -139,12 +141,13 @@ class CanDeleteRequest(BasePermission):
     Permission pour supprimer une requête (admin ou étudiant si status='sent')
     """
     def has_object_permission(self, request, view, obj):
-        if request.user.is_superuser:
+        roles = get_request_roles(request)
+        if roles.is_superuser:
             return True
 
         # L'étudiant peut supprimer seulement si status='sent'
-        if hasattr(request.user, 'student_profile'):
-            if obj.student.user == request.user and obj.can_edit():
+        if roles.is_student:
+            if roles.owns(obj) and obj.can_edit():
                 return True
 
         return False
@@ -156,22 +159,23 @@ class CanUploadAttachment(BasePermission):
     """
     def has_object_permission(self, request, view, obj):
         # obj est une Request
+        roles = get_request_roles(request)
 
         # Admin peut toujours uploader
-        if request.user.is_superuser:
+        if roles.is_superuser:
             return True
 
         # L'étudiant peut uploader sur sa propre requête si status='sent'
-        if hasattr(request.user, 'student_profile'):
-            if obj.student.user == request.user and obj.can_edit():
+        if roles.is_student:
+            if roles.owns(obj) and obj.can_edit():
                 return True
 
         # Staff assigné peut uploader
-        if obj.assigned_to == request.user:
+        if roles.is_assigned_to(obj):
             return True
 
         # Cellule peut uploader si in_cellule
-        if request.user.groups.filter(name='cellule_informatique').exists():
+        if roles.in_cellule_group:
             return obj.status == 'in_cellule'
 
         return False
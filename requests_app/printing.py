@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+
+from .utils import generate_qr_code
+
+
+def render_print_batch(requests, http_request, workers=None):
+    """
+    Génère, morceau par morceau, un document HTML unique pour plusieurs requêtes.
+
+    Le gabarit d'une requête est compilé une seule fois et partagé par un pool
+    de threads; les QR codes viennent du cache commun. Les requêtes doivent
+    être déjà chargées (select_related): aucun accès base dans les threads.
+    """
+    workers = workers or getattr(settings, 'PRINT_BATCH_WORKERS', 4)
+    template = get_template('requests_app/_print_request_body.html')
+
+    def render_one(request_obj):
+        return template.render({
+            'request': request_obj,
+            'qr_code': generate_qr_code(request_obj, http_request),
+        })
+
+    yield render_to_string('requests_app/print_batch_head.html', {
+        'count': len(requests),
+        'today': timezone.now(),
+    })
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for html in pool.map(render_one, requests):
+            yield html
+    yield '</body>\n</html>\n'
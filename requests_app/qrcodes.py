@@ -0,0 +1,150 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import NoReverseMatch, reverse
+from django.utils.module_loading import import_string
+
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+class MemoryQRCodeStore:
+    """Cache LRU en mémoire (par processus)"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, 'QR_CODE_CACHE_SIZE', 1024)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class FileQRCodeStore:
+    """Cache persistant dans le stockage des médias (partagé entre processus)"""
+
+    directory = 'qrcodes'
+
+    def _path(self, key):
+        return f"{self.directory}/{key[:2]}/{key}"
+
+    def get(self, key):
+        try:
+            with default_storage.open(self._path(key), 'rb') as fh:
+                return fh.read()
+        except (FileNotFoundError, OSError):
+            return None
+
+    def set(self, key, data):
+        path = self._path(key)
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(data))
+
+
+class QRCodeCache:
+    """
+    Cache à plusieurs niveaux: on lit dans l'ordre des stores configurés
+    (QR_CODE_CACHE_STORES) et on remplit les niveaux supérieurs au passage.
+    """
+
+    def __init__(self, stores):
+        self.stores = stores
+
+    def get_or_create(self, key, factory):
+        for index, store in enumerate(self.stores):
+            data = store.get(key)
+            if data is not None:
+                for upper in self.stores[:index]:
+                    upper.set(key, data)
+                return data
+        data = factory()
+        for store in self.stores:
+            store.set(key, data)
+        return data
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_qr_code_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                paths = getattr(settings, 'QR_CODE_CACHE_STORES', [
+                    'requests_app.qrcodes.MemoryQRCodeStore',
+                    'requests_app.qrcodes.FileQRCodeStore',
+                ])
+                _cache = QRCodeCache([import_string(path)() for path in paths])
+    return _cache
+
+
+def public_request_url(request_obj, request=None):
+    """URL publique encodée dans le QR code"""
+    try:
+        path = reverse('public_request_view', kwargs={'uuid': str(request_obj.id)})
+    except NoReverseMatch:
+        # Page publique servie par le frontend
+        path = f"/requests/{request_obj.id}/"
+
+    if request:
+        return request.build_absolute_uri(path)
+    return f"http://localhost:8000{path}"
+
+
+def render_qr_code(url, image_format='png'):
+    """Rastérise (PNG) ou vectorise (SVG) le QR code d'une URL"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if image_format == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def qr_code_key(url, image_format):
+    """Clé de cache: l'URL encodée contient déjà l'id de la requête et l'URL de base"""
+    return hashlib.sha256(f"{image_format}|{url}".encode()).hexdigest()
+
+
+def get_qr_code(request_obj, request=None, image_format='png'):
+    """
+    Retourne (octets, clé) du QR code d'une requête, depuis le cache si possible
+    """
+    if image_format not in CONTENT_TYPES:
+        raise ValueError(f"Format de QR code non supporté: {image_format}")
+    url = public_request_url(request_obj, request)
+    key = qr_code_key(url, image_format)
+    data = get_qr_code_cache().get_or_create(key, lambda: render_qr_code(url, image_format))
+    return data, key
@@ -0,0 +1,148 @@
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef
+
+from .models import Student, Lecturer
+
+
+CELLULE_GROUP = 'cellule_informatique'
+
+
+class UserRoles:
+    """
+    Rôles et profils d'un utilisateur, résolus une seule fois par requête HTTP
+    """
+
+    def __init__(self, user, student=None, lecturer=None, in_cellule_group=False):
+        self.user = user
+        self.student = student
+        self.lecturer = lecturer
+        self.in_cellule_group = in_cellule_group
+
+    @property
+    def user_id(self):
+        return self.user.pk
+
+    @property
+    def is_superuser(self):
+        return self.user.is_superuser
+
+    @property
+    def is_student(self):
+        return self.student is not None
+
+    @property
+    def is_lecturer(self):
+        return self.lecturer is not None
+
+    @property
+    def is_hod(self):
+        return self.lecturer is not None and self.lecturer.is_hod
+
+    @property
+    def hod_field_id(self):
+        """Filière dirigée par l'utilisateur (HOD uniquement), sinon None"""
+        if self.is_hod:
+            return self.lecturer.field_id
+        return None
+
+    @property
+    def has_cellule_access(self):
+        """Accès à la cellule (groupe ou indicateur sur le profil enseignant)"""
+        if self.in_cellule_group:
+            return True
+        return self.lecturer is not None and self.lecturer.cellule_informatique
+
+    @property
+    def role(self):
+        if self.is_superuser:
+            return 'admin'
+        if self.is_student:
+            return 'student'
+        if self.is_lecturer:
+            return 'hod' if self.lecturer.is_hod else 'lecturer'
+        if self.in_cellule_group:
+            return 'cellule'
+        return 'user'
+
+    def is_hod_of(self, request_obj):
+        return self.hod_field_id is not None and self.hod_field_id == request_obj.field_id
+
+    def is_assigned_to(self, request_obj):
+        return request_obj.assigned_to_id is not None and request_obj.assigned_to_id == self.user_id
+
+    def owns(self, request_obj):
+        return self.student is not None and request_obj.student_id == self.student.pk
+
+
+def load_user_roles(user):
+    """
+    Charge les profils et l'appartenance à la cellule en une seule requête SQL
+    """
+    if not user.is_authenticated:
+        return UserRoles(user)
+
+    row = User.objects.select_related(
+        'student_profile__class_level', 'student_profile__field', 'lecturer_profile__field'
+    ).annotate(
+        in_cellule_group=Exists(
+            User.groups.through.objects.filter(user_id=OuterRef('pk'), group__name=CELLULE_GROUP)
+        )
+    ).get(pk=user.pk)
+
+    try:
+        student = row.student_profile
+    except Student.DoesNotExist:
+        student = None
+    try:
+        lecturer = row.lecturer_profile
+    except Lecturer.DoesNotExist:
+        lecturer = None
+
+    # Pré-remplir le cache des profils pour que user.student_profile /
+    # user.lecturer_profile ne déclenchent plus de requête
+    User.student_profile.related.set_cached_value(user, student)
+    User.lecturer_profile.related.set_cached_value(user, lecturer)
+
+    return UserRoles(user, student=student, lecturer=lecturer, in_cellule_group=row.in_cellule_group)
+
+
+def get_request_roles(request):
+    """
+    Retourne les rôles de request.user, mémorisés sur la requête HTTP.
+
+    Accepte aussi bien une Request DRF qu'une HttpRequest Django: le cache
+    est posé sur l'HttpRequest sous-jacente, partagée par les deux.
+    """
+    http_request = getattr(request, '_request', request)
+    user = request.user
+    roles = getattr(http_request, '_user_roles', None)
+    if roles is None or roles.user is not user:
+        roles = load_user_roles(user)
+        http_request._user_roles = roles
+    return roles
+
+
+def requests_visible_to(roles, queryset):
+    """Restreint un queryset de Request au périmètre du rôle"""
+    # Étudiant: voir seulement ses requêtes
+    if roles.is_student:
+        return queryset.filter(student=roles.student)
+
+    # Cellule: voir seulement les requêtes in_cellule
+    if roles.in_cellule_group:
+        return queryset.filter(status='in_cellule')
+
+    # Enseignant/HOD: voir les requêtes assignées ou de sa filière
+    if roles.is_lecturer:
+        if roles.hod_field_id is not None:
+            # HOD voit toutes les requêtes de sa filière
+            return queryset.filter(field_id=roles.hod_field_id)
+        else:
+            # Enseignant voit ses requêtes assignées
+            return queryset.filter(assigned_to=roles.user)
+
+    # Admin: voir tout
+    if roles.is_superuser:
+        return queryset
+
+    return queryset.none()
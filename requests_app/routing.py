@@ -0,0 +1,179 @@
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .catalog import VersionedMemoryCache
+from .models import AuditLog, Lecturer, Request, Workload
+from .notifications import NotificationBatch
+from .workload import adjust_workloads, get_workloads
+
+
+class RoutingTable:
+    """
+    Candidats à l'assignation, précalculés: matière -> enseignants (CC),
+    filière -> chefs de département (examen). Les listes suivent l'ordre
+    des profils enseignants, le premier étant l'assigné historique.
+    """
+
+    def __init__(self, subject_lecturers, field_hods):
+        self.subject_lecturers = subject_lecturers
+        self.field_hods = field_hods
+
+    def candidates(self, request_type, subject_id, field_id):
+        """Identifiants des utilisateurs éligibles et clé de routage"""
+        if request_type == 'cc':
+            return self.subject_lecturers.get(subject_id, []), ('subject', subject_id)
+        return self.field_hods.get(field_id, []), ('field', field_id)
+
+
+def build_routing_table():
+    """Deux requêtes, sans JOIN sur les matières ni les filières"""
+    subject_lecturers = defaultdict(list)
+    for subject_id, user_id in Lecturer.subjects.through.objects.order_by(
+        'lecturer_id'
+    ).values_list('subject_id', 'lecturer__user_id'):
+        subject_lecturers[subject_id].append(user_id)
+
+    field_hods = defaultdict(list)
+    for field_id, user_id in Lecturer.objects.filter(
+        is_hod=True, field__isnull=False
+    ).order_by('pk').values_list('field_id', 'user_id'):
+        field_hods[field_id].append(user_id)
+
+    return RoutingTable(dict(subject_lecturers), dict(field_hods))
+
+
+routing_table_cache = VersionedMemoryCache('requests_app:routing-table:version', build_routing_table)
+
+
+class FirstCandidateStrategy:
+    """Toujours le premier candidat (comportement historique)"""
+
+    def choose(self, candidates, key):
+        return candidates[0]
+
+
+class RoundRobinStrategy:
+    """Candidats servis à tour de rôle, par matière ou filière (compteur par processus)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns = defaultdict(int)
+
+    def choose(self, candidates, key):
+        with self._lock:
+            turn = self._turns[key]
+            self._turns[key] = turn + 1
+        return candidates[turn % len(candidates)]
+
+
+class LeastLoadedStrategy:
+    """
+    Candidat ayant le moins de requêtes ouvertes, d'après les charges
+    tenues à jour à chaque transition (voir workload.py)
+    """
+
+    def choose(self, candidates, key):
+        if len(candidates) == 1:
+            return candidates[0]
+        loads = self.get_loads(candidates)
+        # À charge égale, l'ordre de la table départage
+        return min(candidates, key=lambda user_id: loads.get(user_id, 0))
+
+    def get_loads(self, candidates):
+        return get_workloads(candidates)
+
+
+_strategy = None
+_strategy_lock = threading.Lock()
+
+
+def get_assignment_strategy():
+    """Instance unique de la stratégie configurée par ASSIGNMENT_STRATEGY"""
+    global _strategy
+    if _strategy is None:
+        with _strategy_lock:
+            if _strategy is None:
+                path = getattr(settings, 'ASSIGNMENT_STRATEGY', 'requests_app.routing.LeastLoadedStrategy')
+                _strategy = import_string(path)()
+    return _strategy
+
+
+def choose_assignee(request_type, subject_id, field_id):
+    """Identifiant de l'utilisateur à qui assigner une nouvelle requête, ou None"""
+    candidates, key = routing_table_cache.get().candidates(request_type, subject_id, field_id)
+    if not candidates:
+        return None
+    return get_assignment_strategy().choose(candidates, key)
+
+
+def plan_rebalance(statuses=('sent',)):
+    """
+    Réassignations [(requête, ancien assigné, nouvel assigné)] qui
+    égalisent les charges: chaque requête (des plus anciennes aux plus
+    récentes) passe au candidat le moins chargé si l'écart est d'au moins
+    deux. Seules les requêtes non encore prises en charge sont déplacées,
+    et jamais celles assignées hors de la table (choix manuel).
+    """
+    table = routing_table_cache.get()
+    loads = Counter(dict(Workload.objects.values_list('user_id', 'open_requests')))
+
+    moves = []
+    queryset = Request.objects.filter(status__in=statuses).only(
+        'id', 'type', 'subject_id', 'field_id', 'assigned_to_id', 'status', 'student_name'
+    ).order_by('submitted_at', 'id')
+    for req in queryset.iterator(chunk_size=2000):
+        candidates, key = table.candidates(req.type, req.subject_id, req.field_id)
+        current = req.assigned_to_id
+        if not candidates or (current is not None and current not in candidates):
+            continue
+        target = min(candidates, key=lambda user_id: loads[user_id])
+        if current == target or (current is not None and loads[current] - loads[target] < 2):
+            continue
+        if current is not None:
+            loads[current] -= 1
+        loads[target] += 1
+        moves.append((req, current, target))
+    return moves
+
+
+def apply_rebalance(moves, actor=None):
+    """
+    Applique les réassignations par UPDATE conditionnel (une requête prise
+    en charge ou réassignée entre-temps est laissée telle quelle), puis
+    journal, notifications et charges en lot. Retourne le nombre appliqué.
+    """
+    deltas = Counter()
+    logs = []
+    batch = NotificationBatch()
+    with transaction.atomic():
+        for req, from_user_id, to_user_id in moves:
+            updated = Request.objects.filter(
+                pk=req.pk, status=req.status, assigned_to_id=from_user_id
+            ).update(assigned_to_id=to_user_id, version=F('version') + 1)
+            if not updated:
+                continue
+            if from_user_id is not None:
+                deltas[from_user_id] -= 1
+            deltas[to_user_id] += 1
+            logs.append(AuditLog(
+                request_id=req.pk,
+                action='reassign',
+                from_status=req.status,
+                to_status=req.status,
+                actor=actor,
+                note="Requête réassignée pour équilibrer la charge"
+            ))
+            batch.add(
+                to_user_id, "Nouvelle requête assignée",
+                f"Requête de {req.student_name} réassignée pour équilibrer la charge",
+                f"/requests/{req.pk}/"
+            )
+        adjust_workloads(deltas)
+        AuditLog.objects.bulk_create(logs)
+        batch.send()
+    return len(logs)
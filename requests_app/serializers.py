@@ -1,18 +1,63 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch
+from django.urls import reverse
+from drf_spectacular.utils import extend_schema_field
 from .models import (
     ClassLevel, Field, Axis, Subject, Lecturer, Student,
-    Request, RequestResult, Attachment, AuditLog, Notification
+    Request, RequestResult, Attachment, UploadSession, AuditLog, Notification
 )
-
-
-class ClassLevelSerializer(serializers.ModelSerializer):
+from .notifications import notify
+from .roles import get_request_roles
+from .routing import choose_assignee
+from .workflow import RequestConflict, compare_and_swap, request_workflow
+from .workload import adjust_workloads, is_open
+
+
+def changed_values(instance, validated_data):
+    """
+    Colonnes (hors M2M) dont la valeur validée diffère de l'instance.
+    Les clés étrangères sont comparées sur leur identifiant, sans requête.
+    """
+    changes = {}
+    for attr, value in validated_data.items():
+        field = instance._meta.get_field(attr)
+        if field.many_to_many:
+            continue
+        current = getattr(instance, field.attname)
+        if (value.pk if field.is_relation and value is not None else value) != current:
+            changes[attr] = value
+    return changes
+
+
+class PartialUpdateMixin:
+    """
+    update() qui n'écrit que les colonnes modifiées, par
+    save(update_fields=...), au lieu de réécrire toute la ligne
+    """
+
+    def update(self, instance, validated_data):
+        changes = changed_values(instance, validated_data)
+        if changes:
+            for attr, value in changes.items():
+                setattr(instance, attr, value)
+            auto_now = [field.name for field in instance._meta.concrete_fields if getattr(field, 'auto_now', False)]
+            instance.save(update_fields=[*changes, *auto_now])
+        for attr, value in validated_data.items():
+            if instance._meta.get_field(attr).many_to_many:
+                getattr(instance, attr).set(value)
+        return instance
+
+
+class ClassLevelSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     class Meta:
         model = ClassLevel
         fields = ['id', 'name', 'order']
 
 
-class FieldSerializer(serializers.ModelSerializer):
+class FieldSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     allowed_levels = ClassLevelSerializer(many=True, read_only=True)
     allowed_level_ids = serializers.PrimaryKeyRelatedField(
         many=True,
@@ -26,7 +71,7 @@ class FieldSerializer(serializers.ModelSerializer):
         fields = ['id', 'code', 'name', 'allowed_levels', 'allowed_level_ids']
 
 
-class AxisSerializer(serializers.ModelSerializer):
+class AxisSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     field_name = serializers.CharField(source='field.name', read_only=True)
 
     class Meta:
@@ -34,7 +79,7 @@ class AxisSerializer(serializers.ModelSerializer):
         fields = ['id', 'code', 'name', 'field', 'field_name']
 
 
-class SubjectSerializer(serializers.ModelSerializer):
+class SubjectSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     field_name = serializers.CharField(source='field.name', read_only=True)
     class_levels = ClassLevelSerializer(many=True, read_only=True)
     class_level_ids = serializers.PrimaryKeyRelatedField(
@@ -81,17 +126,48 @@ class StudentSerializer(serializers.ModelSerializer):
 
 class AttachmentSerializer(serializers.ModelSerializer):
     uploaded_by_name = serializers.SerializerMethodField()
+    processing_status_display = serializers.CharField(source='get_processing_status_display', read_only=True)
+    download_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Attachment
-        fields = ['id', 'filename', 'file', 'mime_type', 'size', 'uploaded_at', 'uploaded_by', 'uploaded_by_name']
-        read_only_fields = ['uploaded_by', 'uploaded_at', 'filename', 'mime_type', 'size']
+        fields = [
+            'id', 'filename', 'file', 'download_url', 'mime_type', 'size', 'uploaded_at', 'uploaded_by',
+            'uploaded_by_name', 'processing_status', 'processing_status_display', 'processing_error',
+            'checksum', 'thumbnail'
+        ]
+        read_only_fields = [
+            'uploaded_by', 'uploaded_at', 'filename', 'mime_type', 'size',
+            'processing_status', 'processing_error', 'checksum', 'thumbnail'
+        ]
 
     def get_uploaded_by_name(self, obj):
         if obj.uploaded_by:
             return obj.uploaded_by.get_full_name() or obj.uploaded_by.username
         return None
 
+    def get_download_url(self, obj):
+        return reverse('request-download-attachment', kwargs={'pk': obj.request_id, 'attachment_id': obj.pk})
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer pour les uploads en plusieurs morceaux"""
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'received', 'created_at', 'updated_at']
+        read_only_fields = ['received', 'created_at', 'updated_at']
+
+    def validate_size(self, value):
+        from django.conf import settings
+        if value <= 0:
+            raise serializers.ValidationError("Le fichier est vide")
+        if value > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Fichier trop volumineux. Taille max: {settings.MAX_UPLOAD_SIZE / (1024*1024)} MB"
+            )
+        return value
+
 
 class RequestResultSerializer(serializers.ModelSerializer):
     created_by_name = serializers.SerializerMethodField()
@@ -122,10 +198,29 @@ class AuditLogSerializer(serializers.ModelSerializer):
         return None
 
 
+def recent_logs_prefetch():
+    """Derniers journaux de chaque requête (REQUEST_DETAIL_LOGS), acteur compris, dans request.recent_logs"""
+    return Prefetch(
+        'logs',
+        queryset=AuditLog.objects.select_related('actor').order_by('-timestamp', '-id')[:settings.REQUEST_DETAIL_LOGS],
+        to_attr='recent_logs'
+    )
+
+
+def allowed_transitions(serializer, obj):
+    """Actions de workflow ouvertes à l'utilisateur courant (sans requête SQL)"""
+    request = serializer.context.get('request')
+    if request is None:
+        return []
+    return request_workflow.allowed_actions(obj, get_request_roles(request))
+
+
 class RequestSerializer(serializers.ModelSerializer):
     attachments = AttachmentSerializer(many=True, read_only=True)
     result = RequestResultSerializer(read_only=True)
-    logs = AuditLogSerializer(many=True, read_only=True)
+    logs = serializers.SerializerMethodField()
+    logs_count = serializers.SerializerMethodField()
+    history_url = serializers.SerializerMethodField()
 
     # Display fields
     student_display = serializers.SerializerMethodField()
@@ -137,6 +232,7 @@ class RequestSerializer(serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     assigned_to_name = serializers.SerializerMethodField()
     can_edit = serializers.SerializerMethodField()
+    allowed_transitions = serializers.SerializerMethodField()
 
     class Meta:
         model = Request
@@ -146,8 +242,8 @@ class RequestSerializer(serializers.ModelSerializer):
             'field', 'field_display', 'axis', 'axis_display',
             'subject', 'subject_display', 'type', 'type_display',
             'description', 'current_score', 'assigned_to', 'assigned_to_name',
-            'status', 'status_display', 'closed_at', 'can_edit',
-            'attachments', 'result', 'logs'
+            'status', 'status_display', 'closed_at', 'version', 'can_edit', 'allowed_transitions',
+            'attachments', 'result', 'logs', 'logs_count', 'history_url'
         ]
         read_only_fields = ['id', 'student', 'matricule', 'student_name', 'submitted_at', 'status', 'closed_at']
 
@@ -162,6 +258,26 @@ class RequestSerializer(serializers.ModelSerializer):
     def get_can_edit(self, obj):
         return obj.can_edit()
 
+    def get_allowed_transitions(self, obj):
+        return allowed_transitions(self, obj)
+
+    @extend_schema_field(AuditLogSerializer(many=True))
+    def get_logs(self, obj):
+        """Derniers journaux seulement; l'historique complet est paginé sur history_url"""
+        logs = getattr(obj, 'recent_logs', None)
+        if logs is None:
+            logs = obj.logs.select_related('actor').order_by('-timestamp', '-id')[:settings.REQUEST_DETAIL_LOGS]
+        return AuditLogSerializer(logs, many=True).data
+
+    def get_logs_count(self, obj) -> int:
+        logs_count = getattr(obj, 'logs_count', None)
+        if logs_count is None:
+            logs_count = obj.logs.count()
+        return logs_count
+
+    def get_history_url(self, obj) -> str:
+        return reverse('request-history', kwargs={'pk': obj.pk})
+
     def create(self, validated_data):
         user = self.context['request'].user
 
@@ -172,26 +288,20 @@ class RequestSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Utilisateur non étudiant")
 
         # Remplir automatiquement les champs étudiant
+        validated_data.pop('version', None)
         validated_data['student'] = student
         validated_data['matricule'] = student.matricule
         validated_data['student_name'] = user.get_full_name() or user.username
 
+        # Auto-assignation selon le type (CC: enseignant de la matière,
+        # examen: HOD de la filière), résolue avant l'INSERT
+        validated_data['assigned_to_id'] = choose_assignee(
+            validated_data['type'], validated_data['subject'].pk, validated_data['field'].pk
+        )
+
         # Créer la requête
         request_obj = super().create(validated_data)
-
-        # Auto-assignation selon le type
-        if request_obj.type == 'cc':
-            # Assigner au premier enseignant de la matière
-            lecturers = request_obj.subject.lecturers.all()
-            if lecturers.exists():
-                request_obj.assigned_to = lecturers.first().user
-        else:  # exam
-            # Assigner au HOD de la filière
-            hods = Lecturer.objects.filter(is_hod=True, field=request_obj.field)
-            if hods.exists():
-                request_obj.assigned_to = hods.first().user
-
-        request_obj.save()
+        adjust_workloads({request_obj.assigned_to_id: 1})
 
         # Créer le log d'audit
         AuditLog.objects.create(
@@ -203,9 +313,9 @@ class RequestSerializer(serializers.ModelSerializer):
         )
 
         # Créer une notification pour l'assigné
-        if request_obj.assigned_to:
-            Notification.objects.create(
-                user=request_obj.assigned_to,
+        if request_obj.assigned_to_id:
+            notify(
+                user=request_obj.assigned_to_id,
                 title="Nouvelle requête assignée",
                 body=f"Nouvelle requête de {request_obj.student_name} pour {request_obj.subject.name}",
                 link=f"/api/requests/{request_obj.id}/"
@@ -213,23 +323,119 @@ class RequestSerializer(serializers.ModelSerializer):
 
         return request_obj
 
+    def update(self, instance, validated_data):
+        """
+        Compare-and-swap: seules les colonnes modifiées sont écrites, et
+        seulement si la requête n'a pas changé depuis sa lecture (ou depuis
+        la version envoyée par le client); sinon 409. Une requête ouverte
+        réassignée passe d'une charge de travail à l'autre.
+        """
+        expected_version = validated_data.pop('version', instance.version)
+        if expected_version != instance.version:
+            raise RequestConflict()
+        changes = changed_values(instance, validated_data)
+        if changes:
+            previous_assignee = instance.assigned_to_id
+            with transaction.atomic():
+                compare_and_swap([instance], **changes)
+                if 'assigned_to' in changes and is_open(instance.status):
+                    adjust_workloads({previous_assignee: -1, instance.assigned_to_id: 1})
+        return instance
+
+
+class RequestListSerializer(serializers.ModelSerializer):
+    """Représentation allégée pour les listes (sans pièces jointes, résultat ni historique)"""
+    student_display = serializers.SerializerMethodField()
+    class_level_display = serializers.CharField(source='class_level.name', read_only=True)
+    field_display = serializers.CharField(source='field.name', read_only=True)
+    axis_display = serializers.CharField(source='axis.name', read_only=True, allow_null=True)
+    subject_display = serializers.CharField(source='subject.name', read_only=True)
+    type_display = serializers.CharField(source='get_type_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    assigned_to_name = serializers.SerializerMethodField()
+    can_edit = serializers.SerializerMethodField()
+    allowed_transitions = serializers.SerializerMethodField()
+    attachments_count = serializers.IntegerField(read_only=True)
+    logs_count = serializers.IntegerField(read_only=True)
 
-class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Request
+        fields = [
+            'id', 'student', 'student_display', 'matricule', 'student_name',
+            'submitted_at', 'class_level', 'class_level_display',
+            'field', 'field_display', 'axis', 'axis_display',
+            'subject', 'subject_display', 'type', 'type_display',
+            'current_score', 'assigned_to', 'assigned_to_name',
+            'status', 'status_display', 'closed_at', 'version', 'can_edit', 'allowed_transitions',
+            'attachments_count', 'logs_count'
+        ]
+        read_only_fields = fields
+
+    def get_student_display(self, obj):
+        return str(obj.student)
+
+    def get_assigned_to_name(self, obj):
+        if obj.assigned_to:
+            return obj.assigned_to.get_full_name() or obj.assigned_to.username
+        return None
+
+    def get_can_edit(self, obj):
+        return obj.can_edit()
+
+    def get_allowed_transitions(self, obj):
+        return allowed_transitions(self, obj)
+
+
+class NotificationSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'title', 'body', 'link', 'read', 'created_at']
         read_only_fields = ['created_at']
 
 
-class DecisionSerializer(serializers.Serializer):
+class TransitionSerializer(serializers.Serializer):
+    """Corps commun des transitions: version affichée par le client (optionnelle)"""
+    version = serializers.IntegerField(required=False, min_value=0)
+
+
+class DecisionSerializer(TransitionSerializer):
     """Serializer pour la décision initiale (approved/rejected)"""
     decision = serializers.ChoiceField(choices=['approved', 'rejected'])
     reason = serializers.CharField(required=False, allow_blank=True)
     new_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, allow_null=True)
 
 
-class CompleteSerializer(serializers.Serializer):
+class CompleteSerializer(TransitionSerializer):
     """Serializer pour la finalisation de la requête"""
     status = serializers.ChoiceField(choices=['accepted', 'rejected'])
     new_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, allow_null=True)
     reason = serializers.CharField(required=False, allow_blank=True)
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    """Serializer pour l'application d'une transition à un lot de requêtes"""
+    TRANSITION_CHOICES = ['acknowledge', 'decision', 'send_to_cellule', 'complete']
+
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=500)
+    transition = serializers.ChoiceField(choices=TRANSITION_CHOICES)
+    # decision
+    decision = serializers.ChoiceField(choices=['approved', 'rejected'], required=False)
+    # complete
+    status = serializers.ChoiceField(choices=['accepted', 'rejected'], required=False)
+    new_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, allow_null=True)
+    reason = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        if attrs['transition'] == 'decision' and 'decision' not in attrs:
+            raise serializers.ValidationError({'decision': 'Ce champ est requis pour la transition "decision".'})
+        if attrs['transition'] == 'complete' and 'status' not in attrs:
+            raise serializers.ValidationError({'status': 'Ce champ est requis pour la transition "complete".'})
+        # Dédoublonner en conservant l'ordre
+        attrs['ids'] = list(dict.fromkeys(attrs['ids']))
+        return attrs
+
+
+class BulkMarkReadSerializer(serializers.Serializer):
+    """Serializer pour marquer des notifications comme lues en lot (toutes si aucun critère)"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=1000)
+    before = serializers.DateTimeField(required=False)
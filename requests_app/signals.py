@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .attachments import release_blob
+from .catalog import reference_data_cache
+from .models import Attachment, Axis, ClassLevel, Field, Lecturer, Request, Subject, UploadSession
+from .routing import routing_table_cache
+from .uploads import discard_partial
+from .workload import adjust_workloads, is_open
+
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    """Rend la référence de la pièce jointe supprimée (y compris en cascade)"""
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+
+
+@receiver(post_delete, sender=UploadSession)
+def discard_upload_partial(sender, instance, **kwargs):
+    """Supprime le fichier temporaire d'un upload finalisé, abandonné ou expiré"""
+    transaction.on_commit(lambda: discard_partial(instance))
+
+
+@receiver(post_save, sender=ClassLevel)
+@receiver(post_delete, sender=ClassLevel)
+@receiver(post_save, sender=Field)
+@receiver(post_delete, sender=Field)
+@receiver(post_save, sender=Axis)
+@receiver(post_delete, sender=Axis)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(m2m_changed, sender=Field.allowed_levels.through)
+@receiver(m2m_changed, sender=Subject.class_levels.through)
+def invalidate_reference_data(sender, **kwargs):
+    """Référentiel modifié (admin, API ou shell): reconstruit à la prochaine lecture"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(reference_data_cache.invalidate)
+
+
+@receiver(post_save, sender=Lecturer)
+@receiver(post_delete, sender=Lecturer)
+@receiver(m2m_changed, sender=Lecturer.subjects.through)
+def invalidate_routing_table(sender, **kwargs):
+    """Enseignants, HOD ou matières enseignées modifiés: table d'assignation à recalculer"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(routing_table_cache.invalidate)
+
+
+@receiver(post_delete, sender=Request)
+def release_workload(sender, instance, **kwargs):
+    """Requête ouverte supprimée (API, admin ou cascade): l'assigné est déchargé"""
+    if instance.assigned_to_id and is_open(instance.status):
+        adjust_workloads({instance.assigned_to_id: -1})
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .attachments import detect_mime_type
+from .models import UploadSession
+
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadOffsetError(Exception):
+    """Morceau qui ne prolonge pas les octets déjà reçus"""
+
+    def __init__(self, received):
+        super().__init__(f"Morceau non contigu: {received} octets déjà reçus")
+        self.received = received
+
+
+def create_upload_session(request_obj, user, filename, size):
+    """Crée la session et son fichier temporaire vide"""
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    session = UploadSession.objects.create(
+        request=request_obj, uploaded_by=user, filename=filename, size=size
+    )
+    open(session.partial_path, 'wb').close()
+    return session
+
+
+def parse_content_range(header):
+    """'bytes 0-1048575/5242880' -> (0, 1048575, 5242880)"""
+    match = _CONTENT_RANGE.match(header or '')
+    if not match:
+        raise ValueError("En-tête Content-Range invalide (attendu: bytes début-fin/total)")
+    start, end, total = (int(value) for value in match.groups())
+    if end < start or end >= total:
+        raise ValueError("Plage Content-Range incohérente")
+    return start, end, total
+
+
+def write_chunk(session, stream, start, end):
+    """
+    Écrit un morceau à sa position dans le fichier temporaire, par blocs
+    (jamais entièrement en mémoire). Un morceau peut recouvrir des octets
+    déjà reçus (renvoi après une réponse perdue) mais pas laisser de trou.
+    Retourne la session à jour.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if start > session.received:
+            raise UploadOffsetError(session.received)
+
+        remaining = end - start + 1
+        with open(session.partial_path, 'r+b') as fh:
+            fh.seek(start)
+            while remaining:
+                data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+                if not data:
+                    raise ValueError("Corps de requête plus court que la plage annoncée")
+                fh.write(data)
+                remaining -= len(data)
+
+        session.received = max(session.received, end + 1)
+        session.save(update_fields=['received', 'updated_at'])
+    return session
+
+
+def sniff_mime_type(session):
+    """Type MIME d'après le premier morceau uniquement"""
+    with open(session.partial_path, 'rb') as fh:
+        return detect_mime_type(fh.read(2048))
+
+
+class AssembledUpload(File):
+    """
+    Fichier assemblé, vu comme un fichier temporaire d'upload: le stockage
+    le déplace au lieu de le recopier.
+    """
+
+    def __init__(self, file, name, sha256):
+        super().__init__(file, name)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+@contextmanager
+def assembled_file(session):
+    """Fichier complet prêt pour acquire_blob, avec son empreinte"""
+    digest = hashlib.sha256()
+    with open(session.partial_path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+        fh.seek(0)
+        yield AssembledUpload(fh, session.filename, digest.hexdigest())
+
+
+def discard_partial(session):
+    try:
+        os.remove(session.partial_path)
+    except FileNotFoundError:
+        pass
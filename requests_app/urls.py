@@ -17,6 +17,7 @@ router.register(r'notifications', views.NotificationViewSet, basename='notificat
 urlpatterns = [
     # API endpoints
     path('api/', include(router.urls)),
+    path('api/reference-data/', views.reference_data, name='reference_data'),
     
     # API Authentication endpoints (for Next.js frontend)
     path('api/auth/login/', views_api_auth.api_login, name='api_login'),
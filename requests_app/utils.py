@@ -1,12 +1,9 @@
-import qrcode
-from io import BytesIO
 import base64
-from django.urls import reverse
 
 
 def generate_qr_code(request_obj, request=None):
     """
-    Génère un QR code pour une requête
+    Génère un QR code pour une requête (servi depuis le cache des QR codes)
 
     Args:
         request_obj: Instance de Request
@@ -15,32 +12,10 @@ def generate_qr_code(request_obj, request=None):
     Returns:
         str: Data URI de l'image QR code
     """
-    # Construire l'URL publique de la requête
-    path = reverse('public_request_view', kwargs={'uuid': str(request_obj.id)})
-
-    # URL complète
-    if request:
-        url = request.build_absolute_uri(path)
-    else:
-        url = f"http://localhost:8000{path}"
-
-    # Créer le QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-
-    # Générer l'image
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    # Convertir en base64
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
+    from .qrcodes import get_qr_code
+
+    png, _ = get_qr_code(request_obj, request, image_format='png')
+    img_str = base64.b64encode(png).decode()
 
     return f"data:image/png;base64,{img_str}"
 
@@ -95,36 +70,9 @@ def can_user_action_request(user, request_obj, action):
         action: str (acknowledge, decision, send_to_cellule, return_from_cellule, complete)
 
     Returns:
-        bool: True si l'action est autorisée
+        bool: True si l'action est autorisée (mêmes règles que le workflow)
     """
-    # Admin peut tout
-    if user.is_superuser:
-        return True
-
-    # Vérifier les permissions par action
-    if action == 'acknowledge':
-        # Peut marquer comme reçue si assigné et status=sent
-        return (request_obj.assigned_to == user and
-                request_obj.status == 'sent')
-
-    elif action == 'decision':
-        # Peut décider si assigné et status in [sent, received]
-        return (request_obj.assigned_to == user and
-                request_obj.status in ['sent', 'received'])
-
-    elif action == 'send_to_cellule':
-        # Peut envoyer à la cellule si assigné et status=approved
-        return (request_obj.assigned_to == user and
-                request_obj.status == 'approved')
-
-    elif action == 'return_from_cellule':
-        # Cellule peut retourner si status=in_cellule
-        return (user.groups.filter(name='cellule_informatique').exists() and
-                request_obj.status == 'in_cellule')
-
-    elif action == 'complete':
-        # Peut finaliser si assigné et status in [returned, approved]
-        return (request_obj.assigned_to == user and
-                request_obj.status in ['returned', 'approved'])
-
-    return False
+    from .roles import load_user_roles
+    from .workflow import request_workflow
+
+    return action in request_workflow.allowed_actions(request_obj, load_user_roles(user))
@@ -1,9 +1,15 @@
+import uuid
+
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
@@ -11,19 +17,36 @@ from drf_spectacular.types import OpenApiTypes
 
 from .models import (
     ClassLevel, Field, Axis, Subject, Lecturer, Student,
-    Request, RequestResult, Attachment, AuditLog, Notification
+    Request, Attachment, UploadSession, AuditLog, Notification
 )
 from .serializers import (
     ClassLevelSerializer, FieldSerializer, AxisSerializer, SubjectSerializer,
-    LecturerSerializer, StudentSerializer, RequestSerializer,
+    LecturerSerializer, StudentSerializer, RequestSerializer, RequestListSerializer,
     RequestResultSerializer, AttachmentSerializer, AuditLogSerializer,
-    NotificationSerializer, DecisionSerializer, CompleteSerializer
+    NotificationSerializer, TransitionSerializer, DecisionSerializer, CompleteSerializer,
+    BulkTransitionSerializer, BulkMarkReadSerializer, UploadSessionSerializer, recent_logs_prefetch
 )
 from .permissions import (
     IsStudent, IsLecturer, IsHOD, IsCellule, IsSuperAdmin,
     IsAssignedStaff, IsRequestOwnerOrAssigned, CanEditRequest,
     CanDeleteRequest, CanUploadAttachment
 )
+from .roles import get_request_roles, requests_visible_to
+from .notifications import (
+    delete_notifications, get_unread_count, mark_notifications_read, notification_payload, set_notification_read
+)
+from .broker import get_broker, user_channel
+from .pagination import AuditLogPagination, RequestPagination, NotificationPagination
+from .qrcodes import CONTENT_TYPES as QR_CONTENT_TYPES, get_qr_code
+from .printing import render_print_batch
+from .exports import EXPORT_FORMATS, iter_export
+from .attachments import acquire_blob, enqueue_attachment
+from .downloads import attachment_response
+from .catalog import reference_data_cache
+from .workflow import RequestConflict, request_workflow
+from .uploads import (
+    UploadOffsetError, assembled_file, create_upload_session, parse_content_range, sniff_mime_type, write_chunk
+)
 
 
 @extend_schema_view(
@@ -72,7 +95,7 @@ class FieldViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
 
     def get_queryset(self):
-        queryset = Field.objects.all()
+        queryset = Field.objects.prefetch_related('allowed_levels')
         level_id = self.request.query_params.get('level_id')
         if level_id:
             queryset = queryset.filter(allowed_levels__id=level_id)
@@ -103,7 +126,7 @@ class AxisViewSet(viewsets.ModelViewSet):
     """
     ViewSet pour les axes
     """
-    queryset = Axis.objects.all()
+    queryset = Axis.objects.select_related('field')
     serializer_class = AxisSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -139,16 +162,20 @@ class SubjectViewSet(viewsets.ModelViewSet):
     filterset_fields = ['field']
 
     def get_queryset(self):
-        queryset = Subject.objects.all()
+        queryset = Subject.objects.select_related('field').prefetch_related('class_levels')
         field_id = self.request.query_params.get('field_id')
         level_id = self.request.query_params.get('level_id')
 
         if field_id:
             queryset = queryset.filter(field_id=field_id)
         if level_id:
-            queryset = queryset.filter(class_levels__id=level_id)
+            # Sous-requête sur la table de liaison: pas de JOIN, donc pas de
+            # doublons ni de DISTINCT
+            queryset = queryset.filter(
+                pk__in=Subject.class_levels.through.objects.filter(classlevel_id=level_id).values('subject_id')
+            )
 
-        return queryset.distinct()
+        return queryset
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -156,12 +183,89 @@ class SubjectViewSet(viewsets.ModelViewSet):
         return [IsAuthenticated()]
 
 
+@extend_schema(
+    description=(
+        "Référentiel complet (niveaux, filières, axes, matières et leurs liens) en une "
+        "seule réponse, mise en cache et servie avec un ETag (304 si inchangé)"
+    ),
+    responses={200: OpenApiTypes.OBJECT, 304: None}
+)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def reference_data(request):
+    """
+    Remplace les appels en cascade des formulaires d'inscription et de
+    création de requête (level_id, field_id...)
+    """
+    payload, etag = reference_data_cache.get()
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(payload, content_type='application/json')
+    response['ETag'] = etag
+    # Toujours revalider: la réponse 304 est quasi gratuite
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+# Identifiant de session d'upload dans les URL (UUID strict: tout autre
+# segment donne un 404 au lieu d'une erreur de validation)
+UUID_PATTERN = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+
+# Réponse HTTP pour chaque refus du workflow
+TRANSITION_ERROR_STATUS = {
+    'forbidden': status.HTTP_403_FORBIDDEN,
+    'invalid_status': status.HTTP_400_BAD_REQUEST,
+    'has_result': status.HTTP_400_BAD_REQUEST,
+}
+
+
+def _count_subquery(model):
+    """Nombre d'objets liés à la requête, calculé par sous-requête (sans JOIN multiplicatif)"""
+    counts = model.objects.filter(request=OuterRef('pk')).order_by().values('request').annotate(
+        c=Count('pk')
+    ).values('c')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _attach_file(req, user, uploaded_file):
+    """Crée une pièce jointe à partir d'un fichier reçu et planifie son traitement"""
+    with transaction.atomic():
+        # Contenu stocké une seule fois (dédupliqué par SHA-256)
+        blob = acquire_blob(uploaded_file)
+
+        # Créer l'attachment: type MIME et miniature sont calculés en
+        # arrière-plan (voir attachments.py)
+        attachment = Attachment.objects.create(
+            request=req,
+            uploaded_by=user,
+            blob=blob,
+            file=blob.file.name,
+            filename=uploaded_file.name,
+            size=blob.size,
+            checksum=blob.checksum
+        )
+        enqueue_attachment(attachment.pk)
+
+        # Log
+        AuditLog.objects.create(
+            request=req,
+            action='upload_attachment',
+            actor=user,
+            note=f"Pièce jointe ajoutée: {uploaded_file.name}"
+        )
+    return attachment
+
+
 @extend_schema_view(
     list=extend_schema(
         description="Liste des requêtes (filtrée selon le rôle)",
+        responses={200: RequestListSerializer(many=True)},
         parameters=[
             OpenApiParameter(name='status', description='Filtrer par statut', required=False, type=OpenApiTypes.STR),
             OpenApiParameter(name='type', description='Filtrer par type (cc/exam)', required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='pagination', description="'cursor' pour la pagination par curseur (submitted_at, id)", required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='cursor', description='Curseur renvoyé dans le lien next', required=False, type=OpenApiTypes.STR),
         ]
     ),
     retrieve=extend_schema(description="Détails d'une requête"),
@@ -175,42 +279,40 @@ class RequestViewSet(viewsets.ModelViewSet):
     """
     queryset = Request.objects.all().select_related(
         'student', 'student__user', 'class_level', 'field', 'axis', 'subject', 'assigned_to'
-    ).prefetch_related('attachments', 'logs')
+    )
     serializer_class = RequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = RequestPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'type', 'field', 'class_level']
     search_fields = ['matricule', 'student_name', 'subject__name', 'description']
     ordering_fields = ['submitted_at', 'status']
     ordering = ['-submitted_at']
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return RequestListSerializer
+        return RequestSerializer
+
     def get_queryset(self):
-        user = self.request.user
         queryset = super().get_queryset()
 
-        # Étudiant: voir seulement ses requêtes
-        if hasattr(user, 'student_profile'):
-            return queryset.filter(student=user.student_profile)
-
-        # Cellule: voir seulement les requêtes in_cellule
-        if user.groups.filter(name='cellule_informatique').exists():
-            return queryset.filter(status='in_cellule')
-
-        # Enseignant/HOD: voir les requêtes assignées ou de sa filière
-        if hasattr(user, 'lecturer_profile'):
-            lecturer = user.lecturer_profile
-            if lecturer.is_hod and lecturer.field:
-                # HOD voit toutes les requêtes de sa filière
-                return queryset.filter(field=lecturer.field)
-            else:
-                # Enseignant voit ses requêtes assignées
-                return queryset.filter(assigned_to=user)
-
-        # Admin: voir tout
-        if user.is_superuser:
-            return queryset
+        if self.action == 'list':
+            # Liste: colonnes plates + compteurs calculés en base
+            queryset = queryset.annotate(
+                attachments_count=_count_subquery(Attachment),
+                logs_count=_count_subquery(AuditLog),
+            )
+        elif self.action not in (
+            'bulk_transition', 'qr_code', 'print_batch', 'export', 'start_upload', 'upload_chunk', 'complete_upload',
+            'download_attachment', 'history'
+        ):
+            # Détail: derniers journaux seulement, l'historique complet est sur history/
+            queryset = queryset.annotate(logs_count=_count_subquery(AuditLog)).prefetch_related(
+                'attachments', recent_logs_prefetch()
+            )
 
-        return queryset.none()
+        return requests_visible_to(get_request_roles(self.request), queryset)
 
     def get_permissions(self):
         if self.action == 'create':
@@ -219,305 +321,167 @@ class RequestViewSet(viewsets.ModelViewSet):
             return [CanEditRequest()]
         elif self.action == 'destroy':
             return [CanDeleteRequest()]
-        elif self.action in ['acknowledge', 'decision', 'send_to_cellule', 'complete']:
+        elif self.action in ['acknowledge', 'decision', 'send_to_cellule', 'complete', 'bulk_transition']:
             return [IsAssignedStaff()]
         elif self.action == 'return_from_cellule':
             return [IsCellule()]
-        elif self.action == 'upload_attachment':
+        elif self.action in ['upload_attachment', 'start_upload', 'upload_chunk', 'complete_upload']:
             return [CanUploadAttachment()]
         else:
             return [IsRequestOwnerOrAssigned()]
 
+    def _run_transition(self, request, name, version=None, **params):
+        """
+        Applique une transition du workflow à la requête courante. Si le
+        client envoie la version qu'il a affichée, une requête modifiée
+        depuis est refusée (409) au lieu d'être écrasée.
+        """
+        req = self.get_object()
+        if version is not None and version != req.version:
+            raise RequestConflict()
+        _, errors = request_workflow.run(name, [req], get_request_roles(request), **params)
+        if errors:
+            error = errors[req.pk]
+            return Response({'detail': error.detail}, status=TRANSITION_ERROR_STATUS[error.code])
+        return Response(self.get_serializer(req).data)
+
     @extend_schema(
         description="Marquer la requête comme reçue (enseignant/HOD)",
-        request=None,
-        responses={200: RequestSerializer}
+        request=TransitionSerializer,
+        responses={200: RequestSerializer, 409: OpenApiTypes.OBJECT}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAssignedStaff])
     def acknowledge(self, request, pk=None):
         """
         Transition: sent -> received
         """
-        req = self.get_object()
-
-        if req.status != 'sent':
-            return Response(
-                {'detail': f'Cette action n\'est pas possible pour une requête au statut "{req.get_status_display()}"'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        old_status = req.status
-        req.status = 'received'
-        req.save()
-
-        # Log d'audit
-        AuditLog.objects.create(
-            request=req,
-            action='acknowledge',
-            from_status=old_status,
-            to_status=req.status,
-            actor=request.user,
-            note="Requête prise en charge"
-        )
-
-        # Notification à l'étudiant
-        Notification.objects.create(
-            user=req.student.user,
-            title="Requête reçue",
-            body=f"Votre requête pour {req.subject.name} a été prise en charge",
-            link=f"/requests/{req.id}/"
-        )
-
-        serializer = self.get_serializer(req)
-        return Response(serializer.data)
+        serializer = TransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._run_transition(request, 'acknowledge', **serializer.validated_data)
 
     @extend_schema(
         description="Prendre une décision initiale (approved/rejected)",
         request=DecisionSerializer,
-        responses={200: RequestSerializer}
+        responses={200: RequestSerializer, 409: OpenApiTypes.OBJECT}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAssignedStaff])
     def decision(self, request, pk=None):
         """
         Transition: received -> approved OR received -> rejected -> done
         """
-        req = self.get_object()
-
-        if req.status not in ['received', 'sent']:
-            return Response(
-                {'detail': f'Cette action n\'est pas possible pour une requête au statut "{req.get_status_display()}"'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
         serializer = DecisionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-        decision = serializer.validated_data['decision']
-        reason = serializer.validated_data.get('reason', '')
-        new_score = request.data.get('new_score')  # Get new_score from request data
-
-        with transaction.atomic():
-            old_status = req.status
-
-            if decision == 'rejected':
-                # Rejeter immédiatement et terminer
-                req.status = 'done'
-                req.closed_at = timezone.now()
-                req.save()
-
-                # Créer le résultat
-                RequestResult.objects.create(
-                    request=req,
-                    status='rejected',
-                    reason=reason,
-                    created_by=request.user
-                )
-
-                # Log
-                AuditLog.objects.create(
-                    request=req,
-                    action='decision_rejected',
-                    from_status=old_status,
-                    to_status='done',
-                    actor=request.user,
-                    note=f"Requête rejetée: {reason}"
-                )
-
-                # Notification à l'étudiant
-                Notification.objects.create(
-                    user=req.student.user,
-                    title="Requête rejetée",
-                    body=f"Votre requête pour {req.subject.name} a été rejetée. Raison: {reason}",
-                    link=f"/requests/{req.id}/"
-                )
-
-            else:  # approved
-                req.status = 'approved'
-                # Update current_score if provided
-                if new_score is not None:
-                    try:
-                        req.current_score = float(new_score)
-                    except (ValueError, TypeError):
-                        pass
-                req.save()
-
-                # Log
-                AuditLog.objects.create(
-                    request=req,
-                    action='decision_approved',
-                    from_status=old_status,
-                    to_status='approved',
-                    actor=request.user,
-                    note=f"Requête approuvée pour traitement" + (f" (Nouvelle note: {new_score})" if new_score else "")
-                )
-
-                # Notification à l'étudiant
-                Notification.objects.create(
-                    user=req.student.user,
-                    title="Requête approuvée",
-                    body=f"Votre requête pour {req.subject.name} a été approuvée et sera traitée",
-                    link=f"/requests/{req.id}/"
-                )
-
-        result_serializer = self.get_serializer(req)
-        return Response(result_serializer.data)
+        return self._run_transition(
+            request, f"decision_{data['decision']}", version=data.get('version'),
+            reason=data.get('reason', ''), new_score=data.get('new_score')
+        )
 
     @extend_schema(
         description="Envoyer la requête à la cellule informatique",
-        request=None,
-        responses={200: RequestSerializer}
+        request=TransitionSerializer,
+        responses={200: RequestSerializer, 409: OpenApiTypes.OBJECT}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAssignedStaff])
     def send_to_cellule(self, request, pk=None):
         """
         Transition: approved -> in_cellule
         """
-        req = self.get_object()
-
-        if req.status != 'approved':
-            return Response(
-                {'detail': f'Cette action n\'est pas possible pour une requête au statut "{req.get_status_display()}"'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        old_status = req.status
-        req.status = 'in_cellule'
-        req.save()
-
-        # Log
-        AuditLog.objects.create(
-            request=req,
-            action='send_to_cellule',
-            from_status=old_status,
-            to_status='in_cellule',
-            actor=request.user,
-            note="Requête envoyée à la cellule informatique"
-        )
-
-        # Notification à la cellule (tous les membres du groupe)
-        from django.contrib.auth.models import Group
-        try:
-            cellule_group = Group.objects.get(name='cellule_informatique')
-            for user in cellule_group.user_set.all():
-                Notification.objects.create(
-                    user=user,
-                    title="Nouvelle requête en cellule",
-                    body=f"Requête de {req.student_name} pour {req.subject.name}",
-                    link=f"/requests/{req.id}/"
-                )
-        except Group.DoesNotExist:
-            pass
-
-        serializer = self.get_serializer(req)
-        return Response(serializer.data)
+        serializer = TransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._run_transition(request, 'send_to_cellule', **serializer.validated_data)
 
     @extend_schema(
         description="Retourner la requête de la cellule informatique",
-        request=None,
-        responses={200: RequestSerializer}
+        request=TransitionSerializer,
+        responses={200: RequestSerializer, 409: OpenApiTypes.OBJECT}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsCellule])
     def return_from_cellule(self, request, pk=None):
         """
         Transition: in_cellule -> returned
         """
-        req = self.get_object()
-
-        if req.status != 'in_cellule':
-            return Response(
-                {'detail': f'Cette action n\'est pas possible pour une requête au statut "{req.get_status_display()}"'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        old_status = req.status
-        req.status = 'returned'
-        req.save()
-
-        # Log
-        AuditLog.objects.create(
-            request=req,
-            action='return_from_cellule',
-            from_status=old_status,
-            to_status='returned',
-            actor=request.user,
-            note="Requête retournée par la cellule informatique"
-        )
-
-        # Notification à l'assigné
-        if req.assigned_to:
-            Notification.objects.create(
-                user=req.assigned_to,
-                title="Requête retournée de la cellule",
-                body=f"Requête de {req.student_name} pour {req.subject.name} prête pour finalisation",
-                link=f"/requests/{req.id}/"
-            )
-
-        serializer = self.get_serializer(req)
-        return Response(serializer.data)
+        serializer = TransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._run_transition(request, 'return_from_cellule', **serializer.validated_data)
 
     @extend_schema(
         description="Finaliser la requête avec résultat final",
         request=CompleteSerializer,
-        responses={200: RequestSerializer}
+        responses={200: RequestSerializer, 409: OpenApiTypes.OBJECT}
     )
     @action(detail=True, methods=['post'], permission_classes=[IsAssignedStaff])
     def complete(self, request, pk=None):
         """
         Transition: returned -> done (ou approved -> done si pas de cellule)
         """
-        req = self.get_object()
+        serializer = CompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-        if req.status not in ['returned', 'approved']:
-            return Response(
-                {'detail': f'Cette action n\'est pas possible pour une requête au statut "{req.get_status_display()}"'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return self._run_transition(
+            request, 'complete', version=data.get('version'),
+            status=data['status'], new_score=data.get('new_score'), reason=data.get('reason', '')
+        )
 
-        serializer = CompleteSerializer(data=request.data)
+    @extend_schema(
+        description="Appliquer une même transition à un lot de requêtes (enseignant/HOD)",
+        request=BulkTransitionSerializer,
+        responses={200: {'type': 'object', 'properties': {
+            'updated': {'type': 'integer'},
+            'results': {'type': 'array', 'items': {'type': 'object', 'properties': {
+                'id': {'type': 'string', 'format': 'uuid'},
+                'success': {'type': 'boolean'},
+                'status': {'type': 'string'},
+                'detail': {'type': 'string'},
+            }}},
+        }}}
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsAssignedStaff])
+    def bulk_transition(self, request):
+        """
+        Transitions en lot: acknowledge, decision, send_to_cellule, complete.
+
+        Les lignes sont verrouillées puis confiées au moteur de workflow, avec
+        les mêmes gardes que les actions unitaires: un UPDATE conditionnel
+        par version lue (compare_and_swap), résultats, journaux et
+        notifications en bulk_create.
+        """
+        serializer = BulkTransitionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-        with transaction.atomic():
-            old_status = req.status
-
-            # Créer le résultat
-            result = RequestResult.objects.create(
-                request=req,
-                status=serializer.validated_data['status'],
-                new_score=serializer.validated_data.get('new_score'),
-                reason=serializer.validated_data.get('reason', ''),
-                created_by=request.user
-            )
+        ids = data['ids']
+        name = data['transition']
+        if name == 'decision':
+            name = f"decision_{data['decision']}"
+        params = {'reason': data.get('reason', ''), 'new_score': data.get('new_score'), 'status': data.get('status')}
 
-            # Mettre à jour la requête
-            req.status = 'done'
-            req.closed_at = timezone.now()
-            req.save()
-
-            # Log
-            AuditLog.objects.create(
-                request=req,
-                action='complete',
-                from_status=old_status,
-                to_status='done',
-                actor=request.user,
-                note=f"Requête finalisée: {result.get_status_display()}"
+        with transaction.atomic():
+            requests_by_id = {
+                req.pk: req
+                for req in self.get_queryset().filter(pk__in=ids).select_for_update(of=('self',))
+            }
+            applied, errors = request_workflow.run(
+                name, list(requests_by_id.values()), get_request_roles(request), **params
             )
 
-            # Notification à l'étudiant
-            Notification.objects.create(
-                user=req.student.user,
-                title="Requête finalisée",
-                body=f"Votre requête pour {req.subject.name} a été finalisée: {result.get_status_display()}",
-                link=f"/requests/{req.id}/"
-            )
+        results = {req.pk: {'id': str(req.pk), 'success': True, 'status': req.status} for req in applied}
+        for pk in ids:
+            if pk not in results:
+                detail = errors[pk].detail if pk in errors else 'Requête introuvable'
+                results[pk] = {'id': str(pk), 'success': False, 'detail': detail}
 
-        result_serializer = self.get_serializer(req)
-        return Response(result_serializer.data)
+        return Response({
+            'updated': len(applied),
+            'results': [results[pk] for pk in ids],
+        })
 
     @extend_schema(
         description="Uploader une pièce jointe",
         request={'multipart/form-data': {'type': 'object', 'properties': {'file': {'type': 'string', 'format': 'binary'}}}},
-        responses={201: AttachmentSerializer}
+        responses={202: AttachmentSerializer}
     )
     @action(detail=True, methods=['post'], permission_classes=[CanUploadAttachment])
     def upload_attachment(self, request, pk=None):
@@ -542,38 +506,169 @@ class RequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Validation de type MIME
-        import magic
-        mime = magic.Magic(mime=True)
-        mime_type = mime.from_buffer(uploaded_file.read(1024))
-        uploaded_file.seek(0)
+        attachment = _attach_file(req, request.user, uploaded_file)
+
+        serializer = AttachmentSerializer(attachment)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        description="Démarrer un upload de pièce jointe en plusieurs morceaux (reprise possible)",
+        request=UploadSessionSerializer,
+        responses={201: UploadSessionSerializer}
+    )
+    @action(detail=True, methods=['post'], url_path='uploads', permission_classes=[CanUploadAttachment])
+    def start_upload(self, request, pk=None):
+        """
+        Crée une session d'upload; les morceaux sont ensuite envoyés par PUT
+        """
+        req = self.get_object()
 
-        if mime_type not in settings.ALLOWED_FILE_TYPES:
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        session = create_upload_session(
+            req, request.user,
+            filename=serializer.validated_data['filename'],
+            size=serializer.validated_data['size']
+        )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        description=(
+            "GET: octets déjà reçus (pour reprendre). PUT: envoyer un morceau "
+            "(corps brut, en-tête Content-Range: bytes début-fin/total). DELETE: abandonner."
+        ),
+        request={'application/octet-stream': {'type': 'string', 'format': 'binary'}},
+        responses={200: UploadSessionSerializer, 204: None}
+    )
+    @action(
+        detail=True, methods=['get', 'put', 'delete'], url_path=rf'uploads/(?P<upload_id>{UUID_PATTERN})',
+        permission_classes=[CanUploadAttachment]
+    )
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """
+        Reçoit un morceau et l'écrit directement à sa position sur disque
+        """
+        req = self.get_object()
+        session = get_object_or_404(UploadSession, pk=upload_id, request=req, uploaded_by=request.user)
+
+        if request.method == 'GET':
+            return Response(UploadSessionSerializer(session).data)
+
+        if request.method == 'DELETE':
+            session.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            start, end, total = parse_content_range(request.headers.get('Content-Range'))
+            if total != session.size:
+                raise ValueError(f"Taille totale différente de celle annoncée ({session.size} octets)")
+            if request.META.get('CONTENT_LENGTH') != str(end - start + 1):
+                raise ValueError("Content-Length différent de la plage annoncée")
+            session = write_chunk(session, request.stream, start, end)
+        except UploadSession.DoesNotExist:
+            # Finalisée ou abandonnée entre-temps
+            return Response({'detail': 'Upload introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        except UploadOffsetError as exc:
             return Response(
-                {'detail': f'Type de fichier non autorisé: {mime_type}'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'detail': str(exc), 'received': exc.received},
+                status=status.HTTP_409_CONFLICT
             )
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Créer l'attachment
-        attachment = Attachment.objects.create(
-            request=req,
-            uploaded_by=request.user,
-            file=uploaded_file,
-            filename=uploaded_file.name,
-            mime_type=mime_type,
-            size=uploaded_file.size
-        )
+        return Response(UploadSessionSerializer(session).data)
 
-        # Log
-        AuditLog.objects.create(
-            request=req,
-            action='upload_attachment',
-            actor=request.user,
-            note=f"Pièce jointe ajoutée: {uploaded_file.name}"
-        )
+    @extend_schema(
+        description="Finaliser un upload en plusieurs morceaux: crée la pièce jointe",
+        request=None,
+        responses={202: AttachmentSerializer}
+    )
+    @action(
+        detail=True, methods=['post'], url_path=rf'uploads/(?P<upload_id>{UUID_PATTERN})/complete',
+        permission_classes=[CanUploadAttachment]
+    )
+    def complete_upload(self, request, pk=None, upload_id=None):
+        """
+        Vérifie la taille et le type MIME (premier morceau seulement) puis
+        crée la pièce jointe à partir du fichier assemblé
+        """
+        from django.conf import settings
+        req = self.get_object()
+
+        # Session verrouillée jusqu'au commit: un second appel concurrent
+        # attend, puis ne trouve plus la session (404) au lieu d'assembler
+        # le fichier une seconde fois
+        with transaction.atomic():
+            session = get_object_or_404(
+                UploadSession.objects.select_for_update(), pk=upload_id, request=req, uploaded_by=request.user
+            )
+
+            if session.received != session.size:
+                return Response(
+                    {'detail': 'Upload incomplet', 'received': session.received, 'size': session.size},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            mime_type = sniff_mime_type(session)
+            if mime_type not in settings.ALLOWED_FILE_TYPES:
+                session.delete()
+                return Response(
+                    {'detail': f'Type de fichier non autorisé: {mime_type}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            with assembled_file(session) as uploaded_file:
+                attachment = _attach_file(req, request.user, uploaded_file)
+            session.delete()
 
         serializer = AttachmentSerializer(attachment)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        description=(
+            "Télécharger une pièce jointe (Range, ETag/Last-Modified; octets transmis "
+            "par le serveur frontal via X-Accel-Redirect/X-Sendfile)"
+        ),
+        responses={200: {'type': 'string', 'format': 'binary'}, 206: None, 304: None}
+    )
+    @action(
+        detail=True, methods=['get'], url_path=r'attachments/(?P<attachment_id>\d+)/download',
+        permission_classes=[IsRequestOwnerOrAssigned]
+    )
+    def download_attachment(self, request, pk=None, attachment_id=None):
+        """
+        Téléchargement contrôlé par les mêmes droits que la requête
+        """
+        req = self.get_object()
+        attachment = get_object_or_404(Attachment, pk=attachment_id, request=req)
+
+        if attachment.processing_status != 'ready':
+            return Response(
+                {'detail': f'Pièce jointe non disponible ({attachment.get_processing_status_display()})'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return attachment_response(request, attachment)
+
+    @extend_schema(
+        description="Historique complet de la requête, paginé (plus récent d'abord; ?cursor=... pour le mode curseur)",
+        responses={200: AuditLogSerializer(many=True)}
+    )
+    @action(
+        detail=True, methods=['get'], permission_classes=[IsRequestOwnerOrAssigned],
+        pagination_class=AuditLogPagination
+    )
+    def history(self, request, pk=None):
+        """
+        Journaux de la requête avec le nom de l'acteur (un seul JOIN), lus
+        par l'index (request, -timestamp, -id)
+        """
+        req = self.get_object()
+        queryset = AuditLog.objects.filter(request=req).select_related('actor').order_by('-timestamp', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = AuditLogSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @extend_schema(
         description="Voir la page imprimable de la requête",
@@ -584,20 +679,128 @@ class RequestViewSet(viewsets.ModelViewSet):
         """
         Retourne une page HTML stylée pour impression
         """
-        from .utils import generate_qr_code
-        
         req = self.get_object()
-        qr_code = generate_qr_code(req, request)
-        
+        # Image servie séparément (et mise en cache par le navigateur) plutôt qu'en data URI
+        qr_code = reverse('request-qr-code', kwargs={'pk': req.pk}) + '?image=svg'
+
         return render(request, 'requests_app/print_request.html', {
             'request': req,
             'today': timezone.now(),
             'qr_code': qr_code
         })
 
+    @extend_schema(
+        description=(
+            "Document imprimable unique pour plusieurs requêtes: liste d'ids "
+            "(séparés par des virgules) et/ou mêmes filtres que la liste"
+        ),
+        parameters=[
+            OpenApiParameter(name='ids', description="Identifiants séparés par des virgules", required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='status', description='Filtrer par statut', required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='type', description='Filtrer par type (cc/exam)', required=False, type=OpenApiTypes.STR),
+        ],
+        responses={200: {'type': 'string', 'format': 'html'}}
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsRequestOwnerOrAssigned])
+    def print_batch(self, request):
+        """
+        Impression en lot, restreinte aux requêtes visibles par l'utilisateur
+        """
+        from django.conf import settings
+
+        queryset = self.filter_queryset(self.get_queryset())
+
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                ids = [uuid.UUID(value.strip()) for value in ids.split(',') if value.strip()]
+            except ValueError:
+                return Response({'detail': 'Identifiant invalide'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+
+        limit = settings.PRINT_BATCH_MAX
+        requests = list(queryset[:limit + 1])
+        if len(requests) > limit:
+            return Response(
+                {'detail': f'Trop de requêtes à imprimer (max {limit}), affinez les filtres'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return StreamingHttpResponse(
+            render_print_batch(requests, request),
+            content_type='text/html; charset=utf-8'
+        )
+
+    @extend_schema(
+        description="Export en flux (CSV ou JSONL) des requêtes visibles, avec résultat et dernière action",
+        parameters=[
+            OpenApiParameter(name='output', description="csv (défaut) ou jsonl", required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='status', description='Filtrer par statut', required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='type', description='Filtrer par type (cc/exam)', required=False, type=OpenApiTypes.STR),
+        ],
+        responses={200: {'type': 'string', 'format': 'binary'}}
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsRequestOwnerOrAssigned])
+    def export(self, request):
+        """
+        Export complet en mémoire constante (curseur côté serveur)
+        """
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'detail': f'Format non supporté: {export_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            iter_export(queryset, export_format),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        filename = f"requetes-{timezone.now():%Y%m%d-%H%M}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @extend_schema(
+        description="QR code de la requête (image mise en cache, PNG ou SVG)",
+        parameters=[
+            OpenApiParameter(name='image', description="Format de l'image: png (défaut) ou svg", required=False, type=OpenApiTypes.STR),
+        ],
+        responses={200: {'type': 'string', 'format': 'binary'}}
+    )
+    @action(detail=True, methods=['get'], url_path='qr-code', url_name='qr-code',
+            permission_classes=[IsRequestOwnerOrAssigned])
+    def qr_code(self, request, pk=None):
+        """
+        Image du QR code, générée une seule fois par (requête, URL de base)
+        """
+        image_format = request.query_params.get('image', 'png')
+        if image_format not in QR_CONTENT_TYPES:
+            return Response(
+                {'detail': f'Format non supporté: {image_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        req = self.get_object()
+        data, key = get_qr_code(req, request, image_format=image_format)
+        etag = f'"{key}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(data, content_type=QR_CONTENT_TYPES[image_format])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
 
 @extend_schema_view(
-    list=extend_schema(description="Liste des notifications de l'utilisateur connecté"),
+    list=extend_schema(
+        description="Liste des notifications de l'utilisateur connecté",
+        parameters=[
+            OpenApiParameter(name='pagination', description="'cursor' pour la pagination par curseur (created_at, id)", required=False, type=OpenApiTypes.STR),
+            OpenApiParameter(name='cursor', description='Curseur renvoyé dans le lien next', required=False, type=OpenApiTypes.STR),
+        ]
+    ),
     retrieve=extend_schema(description="Détails d'une notification"),
     update=extend_schema(description="Modifier une notification"),
     destroy=extend_schema(description="Supprimer une notification"),
@@ -608,10 +811,26 @@ class NotificationViewSet(viewsets.ModelViewSet):
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NotificationPagination
+
+    POLL_MAX_TIMEOUT = 55
+    POLL_CATCH_UP_LIMIT = 50
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
 
+    def perform_update(self, serializer):
+        # read n'est pas écrit par save(): set_notification_read le bascule
+        # par un UPDATE conditionnel qui garde le compteur exact
+        read = serializer.validated_data.pop('read', None)
+        with transaction.atomic():
+            notification = serializer.save()
+            if read is not None:
+                set_notification_read(notification, read)
+
+    def perform_destroy(self, instance):
+        delete_notifications(Notification.objects.filter(pk=instance.pk))
+
     @extend_schema(
         description="Marquer la notification comme lue",
         request=None,
@@ -620,16 +839,104 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         notification = self.get_object()
+        mark_notifications_read(request.user.pk, Notification.objects.filter(pk=notification.pk), [notification.pk])
         notification.read = True
-        notification.save()
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
 
+    @extend_schema(
+        description="Marquer toutes les notifications comme lues",
+        request=None,
+        responses={200: {'type': 'object', 'properties': {
+            'marked': {'type': 'integer'},
+            'unread_count': {'type': 'integer'},
+        }}}
+    )
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        marked = mark_notifications_read(request.user.pk, Notification.objects.all())
+        return Response({'marked': marked, 'unread_count': get_unread_count(request.user.pk)})
+
+    @extend_schema(
+        description=(
+            "Marquer des notifications comme lues en un seul UPDATE: "
+            "une liste d'ids, toutes celles antérieures à une date, ou toutes si aucun critère"
+        ),
+        request=BulkMarkReadSerializer,
+        responses={200: {'type': 'object', 'properties': {
+            'marked': {'type': 'integer'},
+            'unread_count': {'type': 'integer'},
+        }}}
+    )
+    @action(detail=False, methods=['post'])
+    def bulk_mark_read(self, request):
+        serializer = BulkMarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('ids')
+        before = serializer.validated_data.get('before')
+
+        queryset = Notification.objects.all()
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        if before is not None:
+            queryset = queryset.filter(created_at__lt=before)
+
+        marked = mark_notifications_read(request.user.pk, queryset, ids if before is None else None)
+        return Response({'marked': marked, 'unread_count': get_unread_count(request.user.pk)})
+
     @extend_schema(
         description="Nombre de notifications non lues",
         responses={200: {'type': 'object', 'properties': {'unread_count': {'type': 'integer'}}}}
     )
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        count = Notification.objects.filter(user=request.user, read=False).count()
-        return Response({'unread_count': count})
+        return Response({'unread_count': get_unread_count(request.user.pk)})
+
+    @extend_schema(
+        description=(
+            "Long-polling: attend de nouveaux événements de notification "
+            "(création ou lecture) et renvoie les variations du nombre de non lues"
+        ),
+        parameters=[
+            OpenApiParameter(name='after', description="Renvoyer d'abord les notifications d'id supérieur", required=False, type=OpenApiTypes.INT),
+            OpenApiParameter(name='timeout', description="Attente maximale en secondes (défaut 25, max 55)", required=False, type=OpenApiTypes.INT),
+        ],
+        responses={200: {'type': 'object', 'properties': {
+            'events': {'type': 'array', 'items': {'type': 'object'}},
+            'unread_delta': {'type': 'integer'},
+        }}}
+    )
+    @action(detail=False, methods=['get'])
+    def poll(self, request):
+        """
+        Remplace le polling de unread_count: la requête reste ouverte jusqu'à
+        l'arrivée d'un événement publié sur le canal de l'utilisateur.
+        """
+        try:
+            timeout = min(max(int(request.query_params.get('timeout', 25)), 0), self.POLL_MAX_TIMEOUT)
+        except ValueError:
+            timeout = 25
+
+        # S'abonner avant le rattrapage pour ne rien perdre entre les deux
+        with get_broker().subscribe(user_channel(request.user.pk)) as subscription:
+            events = []
+            after = request.query_params.get('after')
+            if after and after.isdigit():
+                missed = Notification.objects.filter(
+                    user=request.user, pk__gt=int(after)
+                ).order_by('pk')[:self.POLL_CATCH_UP_LIMIT]
+                events = [
+                    {
+                        'type': 'created',
+                        'notification': notification_payload(notification),
+                        'unread_delta': 0 if notification.read else 1,
+                    }
+                    for notification in missed
+                ]
+            if not events:
+                events = subscription.get(timeout=timeout)
+
+        return Response({
+            'events': events,
+            'unread_delta': sum(event['unread_delta'] for event in events),
+        })
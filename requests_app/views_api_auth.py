@@ -9,30 +9,16 @@ from django.middleware.csrf import get_token
 from django.views.decorators.csrf import ensure_csrf_cookie
 from .models import Student, Lecturer
 from .serializers import StudentSerializer, LecturerSerializer
+from .roles import get_request_roles
 
 
-def get_user_role(user):
-    """Determine user's role"""
-    if user.is_superuser:
-        return 'admin'
-    if hasattr(user, 'student_profile'):
-        return 'student'
-    if hasattr(user, 'lecturer_profile'):
-        lecturer = user.lecturer_profile
-        if lecturer.is_hod:
-            return 'hod'
-        return 'lecturer'
-    if user.groups.filter(name='cellule_informatique').exists():
-        return 'cellule'
-    return 'user'
-
-def has_cellule_access(user):
-    """Check if user has access to IT cell (either via group or lecturer flag)"""
-    if user.groups.filter(name='cellule_informatique').exists():
-        return True
-    if hasattr(user, 'lecturer_profile'):
-        return user.lecturer_profile.cellule_informatique
-    return False
+def get_user_role(request):
+    """Determine the current user's role"""
+    return get_request_roles(request).role
+
+def has_cellule_access(request):
+    """Check if the current user has access to IT cell (either via group or lecturer flag)"""
+    return get_request_roles(request).has_cellule_access
 
 
 @api_view(['POST'])
@@ -54,7 +40,7 @@ def api_login(request):
         login(request, user)
         
         # Get user role
-        role = get_user_role(user)
+        role = get_user_role(request)
         
         # Prepare user data
         user_data = {
@@ -170,7 +156,7 @@ def api_signup(request):
 def api_current_user(request):
     """Get current authenticated user's information"""
     user = request.user
-    role = get_user_role(user)
+    role = get_user_role(request)
     
     user_data = {
         'id': user.id,
@@ -0,0 +1,269 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import AuditLog, Request, RequestResult
+from .notifications import NotificationBatch, group_member_ids
+from .roles import CELLULE_GROUP
+from .workload import adjust_workloads, transition_deltas
+
+
+class TransitionError(Exception):
+    """Transition refusée pour une requête (code: forbidden, invalid_status, has_result)"""
+
+    def __init__(self, code, detail):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+class RequestConflict(APIException):
+    """Une requête a été modifiée entre sa lecture et l'UPDATE conditionnel (409)"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'La requête a été modifiée entre-temps, rechargez-la avant de réessayer'
+    default_code = 'conflict'
+
+
+def compare_and_swap(requests, **changes):
+    """
+    Écrit changes sur les requêtes données si aucune n'a changé depuis sa
+    lecture: UPDATE ... SET version = version + 1 WHERE version = <version
+    lue>, un par version distincte. Sinon RequestConflict, et rien n'est
+    écrit (transaction annulée). Les instances sont mises à jour.
+    """
+    by_version = defaultdict(list)
+    for req in requests:
+        by_version[req.version].append(req.pk)
+    with transaction.atomic():
+        for version, pks in by_version.items():
+            updated = Request.objects.filter(pk__in=pks, version=version).update(
+                version=F('version') + 1, **changes
+            )
+            if updated != len(pks):
+                raise RequestConflict()
+    for req in requests:
+        for column, value in changes.items():
+            setattr(req, column, value)
+        req.version += 1
+
+
+def is_assigned_staff(roles, req):
+    """Même règle que IsAssignedStaff: admin, HOD de la filière ou assigné"""
+    return roles.is_superuser or roles.is_hod_of(req) or roles.is_assigned_to(req)
+
+
+def is_cellule(roles, req):
+    """Même règle que IsCellule"""
+    return roles.is_superuser or roles.in_cellule_group
+
+
+def result_label(result_status):
+    return dict(RequestResult.RESULT_CHOICES)[result_status]
+
+
+class Transition:
+    """
+    Une transition du cycle de vie d'une requête.
+
+    name est la clé interne (journal d'audit), action l'endpoint qui la
+    déclenche (decision en regroupe deux). guard(roles, req) décide si
+    l'utilisateur peut l'appliquer. Effets de bord: colonnes modifiées en
+    plus du statut (changes), champs du résultat créé (result), note du
+    journal et notification (title, body) adressée à recipients: 'student',
+    'assignee' ou 'cellule'.
+    """
+
+    def __init__(self, name, sources, target, guard, note, title, body, recipients='student',
+                 action=None, changes=None, result=None):
+        self.name = name
+        self.sources = sources
+        self.target = target
+        self.guard = guard
+        self.note = note
+        self.title = title
+        self.body = body
+        self.recipients = recipients
+        self.action = action or name
+        self.changes = changes
+        self.result = result
+
+    def check(self, roles, req):
+        """TransitionError si la transition n'est pas applicable à req"""
+        if not self.guard(roles, req):
+            raise TransitionError('forbidden', 'Vous n\'êtes pas autorisé à traiter cette requête')
+        if req.status not in self.sources:
+            raise TransitionError(
+                'invalid_status',
+                f'Cette action n\'est pas possible pour une requête au statut "{req.get_status_display()}"'
+            )
+
+    def column_changes(self, params):
+        changes = {'status': self.target}
+        if self.target == 'done':
+            changes['closed_at'] = timezone.now()
+        if self.changes:
+            changes.update(self.changes(params))
+        return changes
+
+
+TRANSITIONS = [
+    Transition(
+        'acknowledge', ['sent'], 'received', is_assigned_staff,
+        note=lambda req, params: "Requête prise en charge",
+        title="Requête reçue",
+        body=lambda req, params: f"Votre requête pour {req.subject.name} a été prise en charge",
+    ),
+    Transition(
+        'decision_approved', ['received', 'sent'], 'approved', is_assigned_staff, action='decision',
+        changes=lambda params: (
+            {'current_score': params['new_score']} if params.get('new_score') is not None else {}
+        ),
+        note=lambda req, params: "Requête approuvée pour traitement" + (
+            f" (Nouvelle note: {params['new_score']})" if params.get('new_score') is not None else ""
+        ),
+        title="Requête approuvée",
+        body=lambda req, params: f"Votre requête pour {req.subject.name} a été approuvée et sera traitée",
+    ),
+    Transition(
+        'decision_rejected', ['received', 'sent'], 'done', is_assigned_staff, action='decision',
+        result=lambda params: {'status': 'rejected', 'reason': params.get('reason', '')},
+        note=lambda req, params: f"Requête rejetée: {params.get('reason', '')}",
+        title="Requête rejetée",
+        body=lambda req, params: (
+            f"Votre requête pour {req.subject.name} a été rejetée. Raison: {params.get('reason', '')}"
+        ),
+    ),
+    Transition(
+        'send_to_cellule', ['approved'], 'in_cellule', is_assigned_staff, recipients='cellule',
+        note=lambda req, params: "Requête envoyée à la cellule informatique",
+        title="Nouvelle requête en cellule",
+        body=lambda req, params: f"Requête de {req.student_name} pour {req.subject.name}",
+    ),
+    Transition(
+        'return_from_cellule', ['in_cellule'], 'returned', is_cellule, recipients='assignee',
+        note=lambda req, params: "Requête retournée par la cellule informatique",
+        title="Requête retournée de la cellule",
+        body=lambda req, params: f"Requête de {req.student_name} pour {req.subject.name} prête pour finalisation",
+    ),
+    Transition(
+        'complete', ['returned', 'approved'], 'done', is_assigned_staff,
+        result=lambda params: {
+            'status': params['status'], 'new_score': params.get('new_score'), 'reason': params.get('reason', '')
+        },
+        note=lambda req, params: f"Requête finalisée: {result_label(params['status'])}",
+        title="Requête finalisée",
+        body=lambda req, params: (
+            f"Votre requête pour {req.subject.name} a été finalisée: {result_label(params['status'])}"
+        ),
+    ),
+]
+
+
+class StateMachine:
+    """
+    Moteur des transitions: contrôle des gardes, UPDATE conditionnel
+    (compare_and_swap, WHERE version = <version lue>) et effets de bord
+    en lot.
+    """
+
+    def __init__(self, transitions):
+        self.transitions = {transition.name: transition for transition in transitions}
+
+    def allowed_actions(self, req, roles):
+        """Actions (endpoints) que l'utilisateur peut appliquer à la requête dans son statut actuel"""
+        actions = []
+        for transition in self.transitions.values():
+            if transition.action in actions or req.status not in transition.sources:
+                continue
+            if transition.guard(roles, req):
+                actions.append(transition.action)
+        return actions
+
+    def run(self, name, requests, roles, **params):
+        """
+        Applique la transition name aux requêtes données.
+
+        Retourne (requêtes transitionnées, {pk: TransitionError}). Les
+        instances transitionnées reflètent les nouvelles valeurs. Lève
+        RequestConflict (transaction annulée) si une requête a changé
+        depuis sa lecture: pour un lot, verrouiller les lignes en amont
+        (select_for_update) évite ce cas.
+        """
+        transition = self.transitions[name]
+        errors = {}
+        eligible = []
+        for req in requests:
+            try:
+                transition.check(roles, req)
+            except TransitionError as exc:
+                errors[req.pk] = exc
+            else:
+                eligible.append(req)
+
+        if not eligible:
+            return [], errors
+
+        with transaction.atomic():
+            if transition.result:
+                with_result = set(
+                    RequestResult.objects.filter(request__in=eligible).values_list('request_id', flat=True)
+                )
+                for req in eligible:
+                    if req.pk in with_result:
+                        errors[req.pk] = TransitionError(
+                            'has_result', 'Un résultat a déjà été enregistré pour cette requête'
+                        )
+                eligible = [req for req in eligible if req.pk not in with_result]
+                if not eligible:
+                    return [], errors
+
+            # Statuts d'origine, avant que compare_and_swap ne modifie les instances
+            from_statuses = {req.pk: req.status for req in eligible}
+            compare_and_swap(eligible, **transition.column_changes(params))
+            self._side_effects(transition, eligible, from_statuses, roles.user, params)
+
+        return eligible, errors
+
+    def _side_effects(self, transition, requests, from_statuses, actor, params):
+        """Résultats, journaux, notifications et charges: une insertion par table"""
+        if transition.result:
+            fields = transition.result(params)
+            RequestResult.objects.bulk_create([
+                RequestResult(request=req, created_by=actor, **fields) for req in requests
+            ])
+
+        adjust_workloads(transition_deltas([
+            (req.assigned_to_id, from_statuses[req.pk], transition.target) for req in requests
+        ]))
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                request=req,
+                action=transition.name,
+                from_status=from_statuses[req.pk],
+                to_status=transition.target,
+                actor=actor,
+                note=transition.note(req, params)
+            )
+            for req in requests
+        ])
+
+        batch = NotificationBatch()
+        cellule_ids = group_member_ids(CELLULE_GROUP) if transition.recipients == 'cellule' else []
+        for req in requests:
+            if transition.recipients == 'student':
+                recipients = [req.student.user_id]
+            elif transition.recipients == 'assignee':
+                recipients = [req.assigned_to_id]
+            else:
+                recipients = cellule_ids
+            body = transition.body(req, params)
+            for user_id in recipients:
+                batch.add(user_id, transition.title, body, f"/requests/{req.id}/")
+        batch.send()
+
+
+request_workflow = StateMachine(TRANSITIONS)
@@ -0,0 +1,76 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Request, Workload
+
+
+# Statuts pour lesquels une requête occupe encore son assigné
+OPEN_STATUSES = ['sent', 'received', 'approved', 'in_cellule', 'returned']
+
+
+def is_open(status):
+    return status in OPEN_STATUSES
+
+
+def adjust_workloads(deltas):
+    """
+    Applique des variations {user_id: delta} aux charges de travail.
+
+    Même schéma que les compteurs de notifications: création des lignes
+    manquantes, puis un UPDATE atomique (F()) par valeur de variation.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if user_id and delta}
+    if not deltas:
+        return
+    Workload.objects.bulk_create(
+        [Workload(user_id=user_id) for user_id in deltas],
+        ignore_conflicts=True
+    )
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        Workload.objects.filter(user_id__in=user_ids).update(
+            open_requests=Greatest(F('open_requests') + delta, 0)
+        )
+
+
+def transition_deltas(changes):
+    """
+    Variations de charge pour des changements [(assigné, ancien statut,
+    nouveau statut)]: seul le passage ouvert <-> fermé compte.
+    """
+    deltas = Counter()
+    for user_id, from_status, to_status in changes:
+        if user_id and is_open(from_status) != is_open(to_status):
+            deltas[user_id] += 1 if is_open(to_status) else -1
+    return deltas
+
+
+def get_workloads(user_ids):
+    """Charges {user_id: requêtes ouvertes} (0 si absent)"""
+    return dict(Workload.objects.filter(user_id__in=user_ids).values_list('user_id', 'open_requests'))
+
+
+def rebuild_workloads():
+    """Recalcule toutes les charges depuis la table des requêtes"""
+    with transaction.atomic():
+        counts = dict(
+            Request.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+            .values_list('assigned_to_id')
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        Workload.objects.exclude(user_id__in=counts).exclude(open_requests=0).update(open_requests=0)
+        Workload.objects.bulk_create(
+            [Workload(user_id=user_id) for user_id in counts],
+            ignore_conflicts=True
+        )
+        workloads = list(Workload.objects.filter(user_id__in=counts))
+        for workload in workloads:
+            workload.open_requests = counts[workload.user_id]
+        Workload.objects.bulk_update(workloads, ['open_requests'], batch_size=1000)
+    return len(workloads)
@@ -155,6 +155,53 @@ ALLOWED_FILE_TYPES = [
     'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
 ]
 
+# Notifications push (long-polling): pub/sub en mémoire par défaut,
+# à remplacer par une classe adossée à un broker externe en multi-processus
+NOTIFICATION_BROKER = os.environ.get('NOTIFICATION_BROKER', 'requests_app.broker.InProcessBroker')
+
+# Cache des QR codes: niveaux interrogés dans l'ordre (mémoire LRU puis médias)
+QR_CODE_CACHE_STORES = [
+    'requests_app.qrcodes.MemoryQRCodeStore',
+    'requests_app.qrcodes.FileQRCodeStore',
+]
+QR_CODE_CACHE_SIZE = 1024
+
+# Impression en lot
+PRINT_BATCH_MAX = 500
+PRINT_BATCH_WORKERS = 4
+
+# Empreinte SHA-256 calculée pendant la réception des fichiers (stockage
+# des pièces jointes adressé par le contenu)
+FILE_UPLOAD_HANDLERS = [
+    'requests_app.attachments.ChecksumMemoryFileUploadHandler',
+    'requests_app.attachments.ChecksumTemporaryFileUploadHandler',
+]
+
+# Uploads en plusieurs morceaux: fichiers temporaires (hors MEDIA_ROOT) et
+# durée de vie d'une session sans nouveau morceau
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'uploads_partial'
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+# Téléchargement des pièces jointes: les octets sont transmis par le serveur
+# frontal ('nginx' -> X-Accel-Redirect vers une location internal pointant
+# sur MEDIA_ROOT, 'apache' -> X-Sendfile). 'django' sert le fichier depuis
+# les workers et n'est prévu que pour le développement.
+ATTACHMENT_SENDFILE_BACKEND = os.environ.get('ATTACHMENT_SENDFILE_BACKEND', 'django' if DEBUG else 'nginx')
+ATTACHMENT_SENDFILE_URL = '/protected-media/'
+
+# Traitement des pièces jointes (MIME, empreinte, miniature) en arrière-plan
+ATTACHMENT_PROCESSING_WORKERS = 2
+ATTACHMENT_PROCESSING_SYNC = False
+
+# Assignation automatique des nouvelles requêtes parmi les candidats de la
+# table de routage: LeastLoadedStrategy (moins de requêtes ouvertes),
+# RoundRobinStrategy ou FirstCandidateStrategy (premier enseignant / HOD)
+ASSIGNMENT_STRATEGY = 'requests_app.routing.LeastLoadedStrategy'
+
+# Nombre de journaux d'audit inclus dans le détail d'une requête (les plus
+# récents); l'historique complet est paginé sur /api/requests/{id}/history/
+REQUEST_DETAIL_LOGS = 5
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 